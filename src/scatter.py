@@ -1,11 +1,22 @@
-import pymel.core as pmc
-from pymel.core.system import Path
-import re
+import time
+
 from PySide2 import QtCore, QtWidgets
-from shiboken2 import wrapInstance
+from shiboken2 import isValid, wrapInstance
 import maya.OpenMayaUI as omui
-import maya.cmds as cmds
-import random
+
+import scatter_engine
+import scatter_pointcache
+from scatter_core import (DISPLAY_MODES, DISTRIBUTIONS, SCATTER_MODES,
+                          SceneFile)
+
+# Milliseconds the live preview waits for the settings to stop changing
+PREVIEW_DELAY = 250
+# Rows the destination list adds each time the view scrolls to its end
+FETCH_SIZE = 200
+POINT_CACHE_FILTER = "Scatter point cache (*{0})".format(
+    scatter_pointcache.EXTENSION)
+
+_dialog = None
 
 
 def maya_main_window():
@@ -14,6 +25,205 @@ def maya_main_window():
     return wrapInstance(long(main_window), QtWidgets.QWidget)
 
 
+def show():
+    """Show the Scatter Tool, built once per session and then re-shown as
+    it was left, with its source, destination and last scatter"""
+    global _dialog
+    if _dialog is None or not isValid(_dialog):
+        _dialog = ScatterToolUI()
+    _dialog.show()
+    _dialog.raise_()
+    _dialog.activateWindow()
+    return _dialog
+
+
+class _TreeItem(object):
+    """A row of DestinationModel that makes its children as they're fetched
+
+    rows is how many children the model has been told about.
+    """
+
+    def __init__(self, parent=None, row=0):
+        self.parent = parent
+        self.row = row
+        self.rows = 0
+        self.children = []
+
+    def has_children(self):
+        return False
+
+    def can_fetch(self):
+        return False
+
+    def next_children(self, count):
+        """Return up to count children following the fetched ones"""
+        return []
+
+    def add_children(self, children):
+        self.children.extend(children)
+        self.rows += len(children)
+
+    def child(self, row):
+        return self.children[row]
+
+
+class _RootItem(_TreeItem):
+    """The destination meshes of a VertexSelection"""
+
+    def __init__(self, selection):
+        super(_RootItem, self).__init__()
+        self.selection = selection
+        self.meshes = selection.meshes()
+
+    def has_children(self):
+        return bool(self.meshes)
+
+    def can_fetch(self):
+        return self.rows < len(self.meshes)
+
+    def next_children(self, count):
+        return [_MeshItem(self, row, self.meshes[row],
+                          self.selection.indices(self.meshes[row]))
+                for row in range(self.rows,
+                                 min(self.rows + count, len(self.meshes)))]
+
+
+class _MeshItem(_TreeItem):
+    """A destination mesh, its children are its runs of vertex ids"""
+
+    def __init__(self, parent, row, mesh, indices):
+        super(_MeshItem, self).__init__(parent, row)
+        self.mesh = mesh
+        self.indices = indices
+        self._position = 0
+
+    def has_children(self):
+        return len(self.indices) > 0
+
+    def can_fetch(self):
+        return self._position < len(self.indices)
+
+    def next_children(self, count):
+        runs = []
+        while len(runs) < count and self.can_fetch():
+            start, end, self._position = scatter_engine.find_run(
+                self.indices, self._position)
+            runs.append(_RunItem(self, self.rows + len(runs), start, end))
+        return runs
+
+    def label(self):
+        count = len(self.indices)
+        return "{0}  ({1} {2})".format(self.mesh, count,
+                                       "vertex" if count == 1 else "vertices")
+
+
+class _RunItem(_TreeItem):
+    """A run of consecutive vertex ids, its vertex rows are only counted"""
+
+    def __init__(self, parent, row, start, end):
+        super(_RunItem, self).__init__(parent, row)
+        self.start = start
+        self.end = end
+
+    def has_children(self):
+        return self.end > self.start
+
+    def can_fetch(self):
+        return self.has_children() and (
+            self.rows < self.end - self.start + 1)
+
+    def next_children(self, count):
+        return [None] * min(count, self.end - self.start + 1 - self.rows)
+
+    def add_children(self, children):
+        self.rows += len(children)
+
+    def child(self, row):
+        return None
+
+    def label(self):
+        if self.start == self.end:
+            return "vtx[{0}]".format(self.start)
+        return "vtx[{0}:{1}]  ({2})".format(self.start, self.end,
+                                          self.end - self.start + 1)
+
+
+class DestinationModel(QtCore.QAbstractItemModel):
+    """Tree of the destination: meshes, their runs of vertex ids and the
+    vertices of a run
+
+    Rows only exist once the view asks for them, FETCH_SIZE at a time, and
+    a run's vertices are never stored, so showing a selection costs the
+    same however many vertices it holds. Every index points at its parent
+    item, vertex rows have no item of their own.
+    """
+
+    def __init__(self, parent=None):
+        super(DestinationModel, self).__init__(parent)
+        self._root = _RootItem(scatter_engine.VertexSelection())
+
+    def set_selection(self, selection):
+        self.beginResetModel()
+        self._root = _RootItem(selection)
+        self.endResetModel()
+
+    def _item(self, index):
+        if not index.isValid():
+            return self._root
+        return index.internalPointer().child(index.row())
+
+    def index(self, row, column, parent=QtCore.QModelIndex()):
+        if not self.hasIndex(row, column, parent):
+            return QtCore.QModelIndex()
+        return self.createIndex(row, column, self._item(parent))
+
+    def parent(self, index):
+        if not index.isValid():
+            return QtCore.QModelIndex()
+        item = index.internalPointer()
+        if item is self._root:
+            return QtCore.QModelIndex()
+        return self.createIndex(item.row, 0, item.parent)
+
+    def rowCount(self, parent=QtCore.QModelIndex()):
+        if parent.column() > 0:
+            return 0
+        item = self._item(parent)
+        if item is None:
+            return 0
+        return item.rows
+
+    def columnCount(self, parent=QtCore.QModelIndex()):
+        return 1
+
+    def hasChildren(self, parent=QtCore.QModelIndex()):
+        item = self._item(parent)
+        return item is not None and item.has_children()
+
+    def canFetchMore(self, parent):
+        item = self._item(parent)
+        return item is not None and item.can_fetch()
+
+    def fetchMore(self, parent):
+        item = self._item(parent)
+        if item is None:
+            return
+        children = item.next_children(FETCH_SIZE)
+        if not children:
+            return
+        self.beginInsertRows(parent, item.rows, item.rows + len(children) - 1)
+        item.add_children(children)
+        self.endInsertRows()
+
+    def data(self, index, role=QtCore.Qt.DisplayRole):
+        if not index.isValid() or role != QtCore.Qt.DisplayRole:
+            return None
+        parent = index.internalPointer()
+        if isinstance(parent, _RunItem):
+            return "vtx[{0}]".format(parent.start + index.row())
+        return parent.child(index.row()).label()
+
+
 class ScatterToolUI(QtWidgets.QDialog):
     """Scatter Tool UI Class"""
 
@@ -25,9 +235,27 @@ class ScatterToolUI(QtWidgets.QDialog):
         self.setWindowFlags(self.windowFlags() ^
                             QtCore.Qt.WindowContextHelpButtonHint)
         self.scenefile = SceneFile()
+        self.scatter_timer = QtCore.QTimer(self)
+        self.scatter_job = None
+        self.progress_dlg = QtWidgets.QProgressDialog(
+            "Scattering...", "Cancel", 0, 0, self)
+        self.progress_dlg.setWindowTitle("Scatter Tool")
+        self.progress_dlg.setWindowModality(QtCore.Qt.WindowModal)
+        self.progress_dlg.setMinimumDuration(0)
+        self.progress_dlg.setAutoReset(False)
+        # Reused by every scatter, reset also stops it showing on its own
+        self.progress_dlg.reset()
+        self.preview_timer = QtCore.QTimer(self)
+        self.preview_timer.setSingleShot(True)
+        self.preview_timer.setInterval(PREVIEW_DELAY)
         self.create_ui()
         self.create_connections()
 
+    def closeEvent(self, event):
+        """Stop the scatter's worker processes while the tool is closed"""
+        self.scenefile.close()
+        super(ScatterToolUI, self).closeEvent(event)
+
     def create_ui(self):
         self.title_lbl = QtWidgets.QLabel("Scatter Tool")
         self.title_lbl.setStyleSheet("font: bold 30px")
@@ -43,7 +271,9 @@ class ScatterToolUI(QtWidgets.QDialog):
         self.main_lay.addLayout(self.scatter_lay)
         self.main_lay.addLayout(self.scatter_btn_lay)
         self.main_lay.addLayout(self.scale_lay)
+        self.main_lay.addLayout(self.scale_btn_lay)
         self.main_lay.addLayout(self.rotate_lay)
+        self.main_lay.addLayout(self.rotate_btn_lay)
         self.main_lay.addLayout(self.rndseed_lay)
         self.setLayout(self.main_lay)
 
@@ -52,19 +282,104 @@ class ScatterToolUI(QtWidgets.QDialog):
         self.source_btn.clicked.connect(self._set_scatter_source)
         self.dest_btn.clicked.connect(self._set_scatter_dest)
         self.scatter_btn.clicked.connect(self._scatter)
+        self.export_btn.clicked.connect(self._export_points)
+        self.import_btn.clicked.connect(self._import_points)
+        self.scale_btn.clicked.connect(self._rerandomize_scale)
+        self.rotate_btn.clicked.connect(self._rerandomize_rotation)
+        self.scatter_timer.timeout.connect(self._scatter_step)
+        self.preview_timer.timeout.connect(self._update_preview)
+        self.preview_cbx.toggled.connect(self._toggle_preview)
+        for spin_box in self._scatter_spin_boxes():
+            spin_box.valueChanged.connect(self._queue_preview)
+        self.align_cbx.toggled.connect(self._queue_preview)
+        self.distribution_cmb.currentIndexChanged.connect(self._queue_preview)
+        self.overlap_cbx.toggled.connect(self._queue_preview)
+        self.offset_cbx.toggled.connect(self._queue_preview)
+        self.density_le.editingFinished.connect(self._set_density_map)
+        self.display_cmb.currentIndexChanged.connect(self._set_display)
+        self.display_btn.clicked.connect(self._set_display)
+
+    def _scatter_spin_boxes(self):
+        return [self.perct_sbx, self.offset_min_sbx, self.offset_max_sbx,
+                self.scalex_min_sbx, self.scalex_max_sbx,
+                self.scaley_min_sbx, self.scaley_max_sbx,
+                self.scalez_min_sbx, self.scalez_max_sbx,
+                self.rotatex_min_sbx, self.rotatex_max_sbx,
+                self.rotatey_min_sbx, self.rotatey_max_sbx,
+                self.rotatez_min_sbx, self.rotatez_max_sbx,
+                self.rndseed_seed_sbx, self.spacing_sbx]
 
     @QtCore.Slot()
     def _set_scatter_source(self):
-        selection = self.scenefile.set_scatter_source()
-        self.source_txt.setText(selection)
+        sources = self.scenefile.set_scatter_source()
+        self.source_tbl.setRowCount(len(sources))
+        for row, source in enumerate(sources):
+            self.source_tbl.setItem(row, 0, QtWidgets.QTableWidgetItem(source))
+            weight_sbx = QtWidgets.QDoubleSpinBox()
+            weight_sbx.setDecimals(2)
+            weight_sbx.setSingleStep(0.1)
+            weight_sbx.setValue(1)
+            weight_sbx.valueChanged.connect(self._queue_preview)
+            self.source_tbl.setCellWidget(row, 1, weight_sbx)
+        self._queue_preview()
 
     @QtCore.Slot()
     def _set_scatter_dest(self):
         selection = self.scenefile.set_scatter_dest()
-        self.dest_txt.setText(str(self.parseArray(selection)))
+        self.dest_model.set_selection(selection)
+        self._queue_preview()
 
     @QtCore.Slot()
-    def _scatter(self):
+    def _set_density_map(self):
+        """Read the density map again, also after repainting the same one"""
+        try:
+            self.scenefile.set_density_map(self.density_le.text().strip())
+        except ValueError as error:
+            QtWidgets.QMessageBox.warning(self, "Density Map", str(error))
+        self._queue_preview()
+
+    @QtCore.Slot()
+    def _set_display(self):
+        """Redraw the last scatter with the display settings, also to
+        update the distance boxes after moving the camera"""
+        self._set_scenefile_properties_from_ui()
+        self.scenefile.set_display()
+
+    @QtCore.Slot()
+    def _queue_preview(self):
+        """Restart the preview delay so a drag only recomputes once it pauses"""
+        if self.preview_cbx.isChecked():
+            self.preview_timer.start()
+
+    @QtCore.Slot(bool)
+    def _toggle_preview(self, checked):
+        if checked:
+            self._update_preview()
+        else:
+            self.preview_timer.stop()
+            self.scenefile.clear_preview()
+
+    @QtCore.Slot()
+    def _update_preview(self):
+        if not self.scenefile.sources or not self.scenefile.destSel:
+            return
+        self._set_scenefile_properties_from_ui()
+        self.scenefile.preview(*self._scatter_args())
+
+    def _set_scenefile_properties_from_ui(self):
+        self.scenefile.distribution = DISTRIBUTIONS[
+            self.distribution_cmb.currentIndex()]
+        self.scenefile.spacing = self.spacing_sbx.value()
+        self.scenefile.avoidOverlap = self.overlap_cbx.isChecked()
+        self.scenefile.displayMode = DISPLAY_MODES[
+            self.display_cmb.currentIndex()]
+        self.scenefile.displayDistance = self.display_dist_sbx.value()
+        self.scenefile.sourceWeights = [
+            self.source_tbl.cellWidget(row, 1).value()
+            for row in range(self.source_tbl.rowCount())]
+
+    def _scatter_args(self):
+        """Return the scatter settings from the UI in SceneFile.scatter order"""
         seed = self.rndseed_seed_sbx.value()
         percent_scatter = self.perct_sbx.value()
         # no need to strip the %, its a suffix added by Qt
@@ -78,23 +393,123 @@ class ScatterToolUI(QtWidgets.QDialog):
                       self.rotatey_min_sbx.value(), self.rotatey_max_sbx.value(),
                       self.rotatez_min_sbx.value(), self.rotatez_max_sbx.value()]
         offset_val = [self.offset_min_sbx.value(), self.offset_max_sbx.value()]
-        self.scenefile.scatter(seed, percent_scatter, align_normal, scale_val,
-                               rotate_val, offset_val, relative_offset)
+        return (seed, percent_scatter, align_normal, scale_val, rotate_val,
+                offset_val, relative_offset)
+
+    @QtCore.Slot()
+    def _rerandomize_scale(self):
+        """Give the selected instances new scales from the scale ranges"""
+        seed, _, _, scale_val, _, _, _ = self._scatter_args()
+        self.scenefile.rerandomize(seed, scale=scale_val)
+
+    @QtCore.Slot()
+    def _rerandomize_rotation(self):
+        """Give the selected instances new rotations from the rotate ranges"""
+        seed, _, align_normal, _, rotate_val, _, _ = self._scatter_args()
+        self.scenefile.rerandomize(seed, rotate=rotate_val, align=align_normal)
+
+    @QtCore.Slot()
+    def _scatter(self):
+        self.preview_timer.stop()
+        self.preview_cbx.setChecked(False)
+        self._set_scenefile_properties_from_ui()
+        mode = SCATTER_MODES[self.mode_cmb.currentIndex()]
+        self.scatter_job = self.scenefile.scatter_iter(
+            *self._scatter_args(), mode=mode,
+            update=self.update_cbx.isChecked())
+        self.scatter_progress = (0, 0)
+        self.scatter_start = time.time()
+        self.progress_dlg.reset()
+        self.progress_dlg.setRange(0, 0)
+        self.progress_dlg.setLabelText("Scattering...")
+        self.progress_dlg.show()
+        # A zero interval timer fires whenever Qt is idle, so each batch of
+        # the scatter runs between UI events instead of blocking them
+        self.scatter_timer.start(0)
+
+    @QtCore.Slot()
+    def _scatter_step(self):
+        """Run the next batch of the scatter and update the progress"""
+        if self.progress_dlg.wasCanceled():
+            self._cancel_scatter()
+            return
+        try:
+            done, total = next(self.scatter_job)
+        except StopIteration:
+            self.scatter_timer.stop()
+            self.scatter_job = None
+            self.progress_dlg.close()
+            return
+        elapsed = max(time.time() - self.scatter_start, 1e-6)
+        rate = done / elapsed
+        remaining = (total - done) / rate if rate else 0.0
+        self.scatter_progress = (done, total)
+        self.progress_dlg.setMaximum(total)
+        self.progress_dlg.setValue(done)
+        self.progress_dlg.setLabelText(
+            "{0} / {1} points\n{2:.0f} points/s, {3:.0f}s left".format(
+                done, total, rate, remaining))
+
+    @QtCore.Slot()
+    def _export_points(self):
+        """Write the scatter to a point cache instead of the scene"""
+        path, _ = QtWidgets.QFileDialog.getSaveFileName(
+            self, "Export Points", "", POINT_CACHE_FILTER)
+        if not path:
+            return
+        self._set_scenefile_properties_from_ui()
+        self.scenefile.export_points(path, *self._scatter_args())
+
+    @QtCore.Slot()
+    def _import_points(self):
+        path, _ = QtWidgets.QFileDialog.getOpenFileName(
+            self, "Import Points", "", POINT_CACHE_FILTER)
+        if not path:
+            return
+        try:
+            self.scenefile.import_points(path)
+        except ValueError as error:
+            QtWidgets.QMessageBox.warning(self, "Import Points", str(error))
+
+    def _cancel_scatter(self):
+        """Stop the scatter and offer to roll back what was done so far"""
+        self.scatter_timer.stop()
+        self.scatter_job.close()
+        self.scatter_job = None
+        self.progress_dlg.close()
+        done, total = self.scatter_progress
+        if not done:
+            self.scenefile.rollback_scatter()
+            return
+        keep = QtWidgets.QMessageBox.question(
+            self, "Scatter Cancelled",
+            "Keep the {0} of {1} points placed so far?".format(done, total))
+        if keep != QtWidgets.QMessageBox.Yes:
+            self.scenefile.rollback_scatter()
 
     def _create_scatter_ui(self):
-        self.source_txt = QtWidgets.QTextEdit()
-        self.source_txt.setTextInteractionFlags(QtCore.Qt.NoTextInteraction)
-        self.source_txt.setFixedHeight(30)
+        self.source_tbl = QtWidgets.QTableWidget(0, 2)
+        self.source_tbl.setHorizontalHeaderLabels(["Source", "Weight"])
+        self.source_tbl.horizontalHeader().setSectionResizeMode(
+            0, QtWidgets.QHeaderView.Stretch)
+        self.source_tbl.verticalHeader().hide()
+        self.source_tbl.setEditTriggers(
+            QtWidgets.QAbstractItemView.NoEditTriggers)
+        self.source_tbl.setFixedHeight(60)
         self.source_btn = QtWidgets.QPushButton("Set Scatter Source")
-        self.dest_txt = QtWidgets.QTextEdit()
-        self.dest_txt.setTextInteractionFlags(QtCore.Qt.NoTextInteraction)
-        self.dest_txt.setFixedHeight(50)
+        self.dest_model = DestinationModel(self)
+        self.dest_view = QtWidgets.QTreeView()
+        self.dest_view.setModel(self.dest_model)
+        self.dest_view.setHeaderHidden(True)
+        # Lets the view skip measuring every row it scrolls past
+        self.dest_view.setUniformRowHeights(True)
+        self.dest_view.setFixedHeight(60)
         self.dest_btn = QtWidgets.QPushButton("Set Scatter Destination")
         layout = self._create_scatter_controls()
         layout.addWidget(self.source_btn, 0, 0)
-        layout.addWidget(self.source_txt, 0, 1)
+        layout.addWidget(self.source_tbl, 0, 1)
         layout.addWidget(self.dest_btn, 0, 2)
-        layout.addWidget(self.dest_txt, 0, 3)
+        layout.addWidget(self.dest_view, 0, 3)
         return layout
         # Improvement: Refactor this to better nest/group widgets, better alignment and positioning controls
         # This nested and return layout structure feels too rabbit-holey/uneasy
@@ -125,6 +540,35 @@ class ScatterToolUI(QtWidgets.QDialog):
         self.offset_cbx_lbl = QtWidgets.QLabel("Object relative offset?")
         self.offset_cbx_lbl.setStyleSheet("font: bold")
         self.offset_cbx = QtWidgets.QCheckBox()
+        self.distribution_cmb_lbl = QtWidgets.QLabel("Distribution")
+        self.distribution_cmb_lbl.setStyleSheet("font: bold")
+        self.distribution_cmb = QtWidgets.QComboBox()
+        self.distribution_cmb.addItems(["Vertices", "Random By Area",
+                                        "Poisson Disk"])
+        self.spacing_sbx_lbl = QtWidgets.QLabel("Min Spacing")
+        self.spacing_sbx_lbl.setStyleSheet("font: bold")
+        self.spacing_sbx = QtWidgets.QDoubleSpinBox()
+        self.spacing_sbx.setDecimals(2)
+        self.spacing_sbx.setSingleStep(0.1)
+        self.spacing_sbx.setValue(1)
+        self.overlap_cbx_lbl = QtWidgets.QLabel("Avoid overlaps?")
+        self.overlap_cbx_lbl.setStyleSheet("font: bold")
+        self.overlap_cbx = QtWidgets.QCheckBox()
+        self.density_le_lbl = QtWidgets.QLabel("Density Map")
+        self.density_le_lbl.setStyleSheet("font: bold")
+        self.density_le = QtWidgets.QLineEdit()
+        self.density_le.setPlaceholderText("color set or 2D texture")
+        self.display_cmb_lbl = QtWidgets.QLabel("Display")
+        self.display_cmb_lbl.setStyleSheet("font: bold")
+        self.display_cmb = QtWidgets.QComboBox()
+        self.display_cmb.addItems(["Auto", "Full Geometry", "Bounding Box"])
+        self.display_dist_sbx_lbl = QtWidgets.QLabel("Box Beyond")
+        self.display_dist_sbx_lbl.setStyleSheet("font: bold")
+        self.display_dist_sbx = QtWidgets.QDoubleSpinBox()
+        self.display_dist_sbx.setDecimals(1)
+        self.display_dist_sbx.setMaximum(100000)
+        self.display_dist_sbx.setSpecialValueText("Any Distance")
+        self.display_btn = QtWidgets.QPushButton("Update Display")
         layout = QtWidgets.QGridLayout()
         perct_sbx = QtWidgets.QHBoxLayout()
         offset_sbx = QtWidgets.QHBoxLayout()
@@ -140,10 +584,37 @@ class ScatterToolUI(QtWidgets.QDialog):
         offset_sbx.addWidget(self.offset_max_sbx)
         offset_cbx.addWidget(self.offset_cbx_lbl)
         offset_cbx.addWidget(self.offset_cbx)
+        distribution_cmb = QtWidgets.QHBoxLayout()
+        distribution_cmb.addWidget(self.distribution_cmb_lbl)
+        distribution_cmb.addWidget(self.distribution_cmb)
+        spacing_sbx = QtWidgets.QHBoxLayout()
+        spacing_sbx.addWidget(self.spacing_sbx_lbl)
+        spacing_sbx.addWidget(self.spacing_sbx)
+        overlap_cbx = QtWidgets.QHBoxLayout()
+        overlap_cbx.addWidget(self.overlap_cbx_lbl)
+        overlap_cbx.addWidget(self.overlap_cbx)
         layout.addLayout(perct_sbx, 1, 0, alignment=QtCore.Qt.AlignCenter)
         layout.addLayout(align_cbx, 1, 1, alignment=QtCore.Qt.AlignCenter)
         layout.addLayout(offset_sbx, 1, 2, alignment=QtCore.Qt.AlignCenter)
         layout.addLayout(offset_cbx, 1, 3, alignment=QtCore.Qt.AlignCenter)
+        layout.addLayout(distribution_cmb, 2, 0,
+                         alignment=QtCore.Qt.AlignCenter)
+        layout.addLayout(spacing_sbx, 2, 1, alignment=QtCore.Qt.AlignCenter)
+        density_le = QtWidgets.QHBoxLayout()
+        density_le.addWidget(self.density_le_lbl)
+        density_le.addWidget(self.density_le)
+        layout.addLayout(overlap_cbx, 2, 2, alignment=QtCore.Qt.AlignCenter)
+        layout.addLayout(density_le, 2, 3, alignment=QtCore.Qt.AlignCenter)
+        display_cmb = QtWidgets.QHBoxLayout()
+        display_cmb.addWidget(self.display_cmb_lbl)
+        display_cmb.addWidget(self.display_cmb)
+        display_dist_sbx = QtWidgets.QHBoxLayout()
+        display_dist_sbx.addWidget(self.display_dist_sbx_lbl)
+        display_dist_sbx.addWidget(self.display_dist_sbx)
+        layout.addLayout(display_cmb, 3, 0, alignment=QtCore.Qt.AlignCenter)
+        layout.addLayout(display_dist_sbx, 3, 1,
+                         alignment=QtCore.Qt.AlignCenter)
+        layout.addWidget(self.display_btn, 3, 2)
         return layout
 
     def _create_scale_ui(self):
@@ -261,8 +732,29 @@ class ScatterToolUI(QtWidgets.QDialog):
 
     def _create_scatter_button_ui(self):
         self.scatter_btn = QtWidgets.QPushButton("Scatter")
+        self.mode_cmb_lbl = QtWidgets.QLabel("Scatter As")
+        self.mode_cmb_lbl.setStyleSheet("font: bold")
+        self.mode_cmb = QtWidgets.QComboBox()
+        self.mode_cmb.addItems([mode.capitalize() for mode in SCATTER_MODES])
+        self.preview_cbx_lbl = QtWidgets.QLabel("Live Preview")
+        self.preview_cbx_lbl.setStyleSheet("font: bold")
+        self.preview_cbx = QtWidgets.QCheckBox()
+        self.update_cbx_lbl = QtWidgets.QLabel("Update Previous")
+        self.update_cbx_lbl.setStyleSheet("font: bold")
+        self.update_cbx = QtWidgets.QCheckBox()
+        self.update_cbx.setChecked(False)
+        self.export_btn = QtWidgets.QPushButton("Export Points")
+        self.import_btn = QtWidgets.QPushButton("Import Points")
         layout = QtWidgets.QHBoxLayout()
+        layout.addWidget(self.update_cbx_lbl)
+        layout.addWidget(self.update_cbx)
+        layout.addWidget(self.preview_cbx_lbl)
+        layout.addWidget(self.preview_cbx)
+        layout.addWidget(self.mode_cmb_lbl)
+        layout.addWidget(self.mode_cmb)
         layout.addWidget(self.scatter_btn)
+        layout.addWidget(self.export_btn)
+        layout.addWidget(self.import_btn)
         return layout
 
     def _create_scale_button_ui(self):
@@ -286,84 +778,3 @@ class ScatterToolUI(QtWidgets.QDialog):
         layout.addWidget(self.rndseed_title_lbl)
         layout.addWidget(self.rndseed_seed_sbx)
         return layout
-
-    def parseArray(self, selection):
-        str1 = ", ".join(selection)
-        return str1
-
-
-class SceneFile(object):
-
-    """Scenfile Operations"""
-
-    def set_scatter_source(self):
-        selection = cmds.ls(os=True, fl=True)
-        self.sourceObject = selection[0]
-        return self.sourceObject
-
-    def set_scatter_dest(self):
-        selection = cmds.ls(os=True, fl=True)
-        self.destSel = cmds.filterExpand(
-            selection, selectionMask=31, expand=True)
-        if self.destSel is not None:
-            print(self.destSel)
-            return self.destSel
-        else:
-            convVert = cmds.polyListComponentConversion(selection, tv=True)
-            self.destSel = cmds.filterExpand(
-                convVert, selectionMask=31, expand=True)
-            print(self.destSel)
-            return self.destSel
-        """Is there a better way to do this than expanding selection.vtx[*] into every single vert?
-            Only use and display selection.vtx[*], since a can only select one Warning is given"""
-
-    def scatter(self, seed, percent, align, scale,
-                rotate, offset, relativeOffset):
-        random.seed(seed)
-        random_amount = int(round(len(self.destSel) * percent))
-        percentage_select = random.sample(self.destSel, k=random_amount)
-        # Refactor prcnt_select to use a flag instead of always running?
-        if cmds.objectType(self.sourceObject, isType="transform"):
-            for vertex in percentage_select:
-                scaleX = random.uniform(scale[0], scale[1])
-                scaleY = random.uniform(scale[2], scale[3])
-                scaleZ = random.uniform(scale[4], scale[5])
-                rotateX = random.uniform(rotate[0], rotate[1])
-                rotateY = random.uniform(rotate[2], rotate[3])
-                rotateZ = random.uniform(rotate[4], rotate[5])
-                offsetY = random.uniform(offset[0], offset[1])
-                print(offsetY)
-                scatter_instance = cmds.instance(self.sourceObject)
-                position = cmds.pointPosition(vertex, w=True)
-                meshvert = pmc.MeshVertex(vertex)
-                vtx_normal = meshvert.getNormal()
-                up_vector = pmc.datatypes.Vector(0.0, 1.0, 0)
-                tangent = vtx_normal.cross(up_vector).normal()
-                tangent2 = vtx_normal.cross(tangent).normal()
-                matrix_transform = [tangent2.x, tangent2.y, tangent2.z, 0.0,
-                                    vtx_normal.x, vtx_normal.y, vtx_normal.z, 0.0,
-                                    tangent.x, tangent.y, tangent.z, 0.0,
-                                    position[0], position[1], position[2], 1.0]
-                # How to include scale and rotation into 4x4 matrix
-                # supplied?
-                if align:
-                    cmds.xform(scatter_instance, ws=True, m=matrix_transform)
-                    cmds.scale(scaleX, scaleY, scaleZ, scatter_instance)
-                    if relativeOffset:  # Better way to do this than two flags? Dislike how this feels
-                        cmds.move(0, offsetY, 0, scatter_instance,
-                                  r=True, os=True, wd=True)
-                    else:
-                        cmds.move(0, offsetY, 0, scatter_instance,
-                                  r=True, ws=True)
-                    #cmds.rotate(rotateX, rotateY, rotateZ, scatter_instance)
-                    # This method is not constraining instances to parent
-                    # vertices. What's missing vs things like Point on Poly?
-                    continue
-                cmds.xform(scatter_instance, scale=[scaleX, scaleY, scaleZ], rotation=[rotateX, rotateY, rotateZ],
-                           translation=[position[0], position[1], position[2]], ws=True)
-                if relativeOffset:
-                    cmds.move(0, offsetY, 0, scatter_instance,
-                              r=True, os=True, wd=True)
-                else:
-                    cmds.move(0, offsetY, 0, scatter_instance,
-                              r=True, ws=True)
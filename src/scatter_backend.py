@@ -0,0 +1,333 @@
+"""Scene access for the scatter core
+
+SceneFile in scatter_core never touches a scene directly, it goes through a
+SceneBackend: queries for the selection and mesh arrays, and writes that
+create instances, set their transforms and drive instancers. MayaBackend in
+scatter_maya talks to a Maya session, MemoryBackend here keeps a plain Python
+scene so scatters can run headless and be tested without Maya.
+"""
+import array
+import contextlib
+import itertools
+import math
+import re
+
+import scatter_engine
+
+_COMPONENT_RE = re.compile(r"^(?P<mesh>[^.]+)\.vtx\[(?P<start>\d+)"
+                           r"(?::(?P<end>\d+))?\]$")
+_TRAILING_DIGITS_RE = re.compile(r"\d+$")
+_IDENTITY = (1.0, 0.0, 0.0, 0.0, 0.0, 1.0, 0.0, 0.0,
+             0.0, 0.0, 1.0, 0.0, 0.0, 0.0, 0.0, 1.0)
+
+
+def _multiply(a, b):
+    """Return the flat 4x4 row vector matrix a then b"""
+    return [sum(a[row * 4 + k] * b[k * 4 + column] for k in range(4))
+            for row in range(4) for column in range(4)]
+
+
+class SceneBackend(object):
+    """What the scatter core needs from a scene
+
+    Nodes are referred to by name. Matrices are 16 floats in Maya's row
+    vector layout and points travel as scatter_engine.TransformBatch.
+    """
+
+    # Scene commands run so far, a backend without commands keeps it at 0
+    commands = 0
+
+    def selection(self):
+        """Return the selected objects and components in selection order"""
+        raise NotImplementedError
+
+    def vertex_selection(self, selection):
+        """Return a VertexSelection of the vertices in selection, meshes
+        standing for all their vertices"""
+        raise NotImplementedError
+
+    def mesh_arrays(self, mesh):
+        """Return flat world space positions and normals, three per vertex"""
+        raise NotImplementedError
+
+    def mesh_triangles(self, mesh):
+        """Return the vertex ids of the mesh triangulation, three per
+        triangle"""
+        raise NotImplementedError
+
+    def vertex_weights(self, mesh, density_map):
+        """Return one weight per vertex of mesh, 0 to 1, from density_map: a
+        color set of mesh or a 2D texture sampled at the vertex UVs"""
+        raise NotImplementedError
+
+    def bounding_radius(self, node):
+        """Return the radius around its pivot that holds node's geometry"""
+        raise NotImplementedError
+
+    def watch_mesh(self, mesh, callback):
+        """Call callback(mesh) once mesh's geometry or world transform
+        changes or it is deleted, returning a handle for unwatch"""
+        raise NotImplementedError
+
+    def unwatch(self, handle):
+        """Stop a watch_mesh callback"""
+        raise NotImplementedError
+
+    def is_transform(self, node):
+        raise NotImplementedError
+
+    def exists(self, node):
+        raise NotImplementedError
+
+    def delete(self, nodes):
+        raise NotImplementedError
+
+    def create_group(self, name):
+        """Create an empty transform and return its name"""
+        raise NotImplementedError
+
+    def create_instances(self, source, count, parent):
+        """Instance source count times under parent, returning the names"""
+        raise NotImplementedError
+
+    def get_transforms(self, nodes, world=False):
+        """Return the object space matrix of each node, or its world space
+        one with world"""
+        raise NotImplementedError
+
+    def set_transforms(self, nodes, matrices):
+        """Set the object space matrix of each node"""
+        raise NotImplementedError
+
+    def create_instancer(self, sources, name):
+        """Create an instancer drawing a list of sources and return its
+        name"""
+        raise NotImplementedError
+
+    def set_instancer_points(self, instancer, transforms,
+                             object_indices=None):
+        """Replace the points of instancer with a TransformBatch, point i
+        drawing source object_indices[i], or the first without them"""
+        raise NotImplementedError
+
+    def create_proxy(self, source, name):
+        """Create a hidden stand-in the size of source for previews"""
+        raise NotImplementedError
+
+    def set_display(self, nodes, mode):
+        """Draw nodes, and what is below them, as "full" geometry or
+        "bbox" bounding boxes in the viewport, renders are unaffected"""
+        raise NotImplementedError
+
+    def camera_position(self):
+        """Return the world position of the camera the artist looks
+        through"""
+        raise NotImplementedError
+
+    @contextlib.contextmanager
+    def batch(self, name):
+        """Run the block as one undo step"""
+        yield
+
+    @contextlib.contextmanager
+    def no_undo(self):
+        """Keep the block out of the undo queue"""
+        yield
+
+    def undo(self):
+        """Undo the last batch"""
+        raise NotImplementedError
+
+    def prepare_workers(self):
+        """Get multiprocessing ready to start worker processes"""
+
+    def can_fork(self):
+        """Return whether worker processes may be forked off this one, for
+        Pythons that can't spawn them"""
+        return True
+
+
+class MemoryBackend(SceneBackend):
+    """A scene held in dictionaries, for headless runs and tests
+
+    Meshes are added with add_mesh, their positions are taken as both world
+    and object space. Every node is a dict with at least a "type" and a
+    "parent", instances also carry their "source" and "matrix", instancers
+    their "sources", "points" and "object_indices", and nodes given a
+    display by set_display keep it as "display". Opening a batch snapshots
+    the nodes, only the last batch can be undone. Adding a mesh under a
+    name already taken replaces it and counts as a change of that mesh for
+    watch_mesh, so does adding a density map to it.
+    """
+
+    def __init__(self):
+        self.meshes = {}
+        self.densityMaps = {}
+        self.nodes = {}
+        self.selected = []
+        self.camera = (0.0, 0.0, 0.0)
+        self._undoNodes = None
+        self._nameCounters = {}
+        self._watchers = {}
+        self._watchIds = itertools.count()
+
+    def add_mesh(self, name, positions, normals, triangles):
+        """Add a mesh from flat positions, normals and triangle vertex ids"""
+        self.meshes[name] = (array.array('d', positions),
+                             array.array('d', normals),
+                             array.array('l', triangles))
+        self.nodes[name] = {"type": "mesh", "parent": None}
+        self._changed(name)
+        return name
+
+    def add_density_map(self, mesh, name, weights):
+        """Add per vertex weights to mesh under name"""
+        self.densityMaps[(mesh, name)] = array.array('d', weights)
+        self._changed(mesh)
+
+    def _changed(self, mesh):
+        for callback in list(self._watchers.get(mesh, {}).values()):
+            callback(mesh)
+
+    def select(self, *names):
+        self.selected = list(names)
+
+    def _unique_name(self, name):
+        if name not in self.nodes:
+            return name
+        base = _TRAILING_DIGITS_RE.sub("", name)
+        number = self._nameCounters.get(base, 0) + 1
+        while "{0}{1}".format(base, number) in self.nodes:
+            number += 1
+        self._nameCounters[base] = number
+        return "{0}{1}".format(base, number)
+
+    def _add_node(self, name, node_type, **values):
+        name = self._unique_name(name)
+        node = {"type": node_type, "parent": None}
+        node.update(values)
+        self.nodes[name] = node
+        return name
+
+    def selection(self):
+        return list(self.selected)
+
+    def vertex_selection(self, selection):
+        """Accept mesh names and "mesh.vtx[i]" or "mesh.vtx[i:j]" items"""
+        vertex_sel = scatter_engine.VertexSelection()
+        for item in selection:
+            if item in self.meshes:
+                vertex_sel.add(item, range(len(self.meshes[item][0]) // 3))
+                continue
+            match = _COMPONENT_RE.match(item)
+            if not match or match.group("mesh") not in self.meshes:
+                raise ValueError("Not a mesh or vertex: {0}".format(item))
+            start = int(match.group("start"))
+            end = int(match.group("end") or start)
+            vertex_sel.add(match.group("mesh"), range(start, end + 1))
+        return vertex_sel
+
+    def mesh_arrays(self, mesh):
+        # Copies, like a scene query builds new arrays every time
+        positions, normals, _ = self.meshes[mesh]
+        return array.array('d', positions), array.array('d', normals)
+
+    def mesh_triangles(self, mesh):
+        return array.array('l', self.meshes[mesh][2])
+
+    def vertex_weights(self, mesh, density_map):
+        if (mesh, density_map) not in self.densityMaps:
+            raise ValueError("No density map {0} on {1}".format(
+                density_map, mesh))
+        return self.densityMaps[(mesh, density_map)]
+
+    def bounding_radius(self, node):
+        positions = self.meshes[node][0]
+        radius = 0.0
+        for i in range(0, len(positions), 3):
+            x, y, z = positions[i:i + 3]
+            radius = max(radius, math.sqrt(x * x + y * y + z * z))
+        return radius
+
+    def watch_mesh(self, mesh, callback):
+        handle = (mesh, next(self._watchIds))
+        self._watchers.setdefault(mesh, {})[handle] = callback
+        return handle
+
+    def unwatch(self, handle):
+        self._watchers.get(handle[0], {}).pop(handle, None)
+
+    def is_transform(self, node):
+        return self.nodes[node]["type"] in ("mesh", "group", "instance")
+
+    def exists(self, node):
+        return node in self.nodes
+
+    def delete(self, nodes):
+        doomed = set(nodes)
+        # Children go with their parent, like in Maya
+        for name, node in self.nodes.items():
+            if node["parent"] in doomed:
+                doomed.add(name)
+        for name in doomed:
+            self.nodes.pop(name, None)
+            if self.meshes.pop(name, None) is not None:
+                self._changed(name)
+
+    def create_group(self, name):
+        return self._add_node(name, "group")
+
+    def create_instances(self, source, count, parent):
+        return [self._add_node(source, "instance", parent=parent,
+                               source=source, matrix=None)
+                for _ in range(count)]
+
+    def get_transforms(self, nodes, world=False):
+        matrices = []
+        for node in nodes:
+            matrix = list(self.nodes[node].get("matrix") or _IDENTITY)
+            parent = self.nodes[node]["parent"]
+            while world and parent is not None:
+                matrix = _multiply(matrix, self.nodes[parent].get("matrix") or
+                                   _IDENTITY)
+                parent = self.nodes[parent]["parent"]
+            matrices.append(matrix)
+        return matrices
+
+    def set_transforms(self, nodes, matrices):
+        for node, matrix in zip(nodes, matrices):
+            self.nodes[node]["matrix"] = list(matrix)
+
+    def create_instancer(self, sources, name):
+        return self._add_node(name, "instancer", sources=list(sources),
+                              points=scatter_engine.TransformBatch(),
+                              object_indices=None)
+
+    def set_instancer_points(self, instancer, transforms,
+                             object_indices=None):
+        node = self.nodes[instancer]
+        node["points"] = scatter_engine.TransformBatch(
+            array.array('d', transforms.matrices))
+        node["object_indices"] = (None if object_indices is None
+                                  else array.array('l', object_indices))
+
+    def create_proxy(self, source, name):
+        return self._add_node(name, "proxy", source=source)
+
+    def set_display(self, nodes, mode):
+        for node in nodes:
+            self.nodes[node]["display"] = mode
+
+    def camera_position(self):
+        return self.camera
+
+    @contextlib.contextmanager
+    def batch(self, name):
+        self._undoNodes = dict((node_name, dict(node))
+                               for node_name, node in self.nodes.items())
+        yield
+
+    def undo(self):
+        if self._undoNodes is not None:
+            self.nodes = self._undoNodes
+            self._undoNodes = None
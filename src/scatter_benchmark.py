@@ -0,0 +1,337 @@
+"""Benchmark the scatter phases on synthetic meshes
+
+Runs SceneFile against a MemoryBackend, so it needs no Maya:
+
+    python scatter_benchmark.py --output before.json
+    python scatter_benchmark.py --output after.json --compare before.json
+
+Every shape (a flat grid, a UV sphere and a noisy terrain) is built at every
+size and scattered once per repeat. The phases are timed separately:
+selection expansion, the mesh position and normal query, sampling,
+transform generation, creating an instance per point and writing the points
+to an instancer. The fastest repeat is kept.
+A second, traced run records the peak Python memory of each phase, it is
+skipped with --no-memory.
+
+Results are written as JSON, one record per shape, size and phase, sorted so
+two files diff cleanly. --compare prints the time ratio against an earlier
+file.
+"""
+import argparse
+import array
+import gc
+import json
+import math
+import platform
+import subprocess
+import sys
+import time
+
+try:
+    import tracemalloc
+except ImportError:
+    # Python 2 has no tracemalloc, only the timings are recorded there
+    tracemalloc = None
+
+import scatter_backend
+import scatter_core
+import scatter_engine
+import scatter_stats
+
+SHAPES = ["grid", "sphere", "terrain"]
+SIZES = [1000, 10000, 100000, 1000000]
+PHASES = ["select", "query", "sample", "transform", "instances",
+          "instancer"]
+SOURCE = "source_cube"
+# Scatter settings used for every run, in SceneFile.scatter order after the
+# percentage
+ALIGN = True
+SCALE = [0.5, 1.5, 0.5, 1.5, 0.5, 1.5]
+ROTATE = [0, 360, 0, 360, 0, 360]
+OFFSET = [0.0, 0.2]
+
+
+def _grid_size(count):
+    side = max(2, int(round(math.sqrt(count))))
+    return side, side
+
+
+def _grid_triangles(columns, rows):
+    triangles = array.array('l')
+    for j in range(rows - 1):
+        for i in range(columns - 1):
+            a = j * columns + i
+            triangles.extend((a, a + 1, a + columns,
+                              a + 1, a + columns + 1, a + columns))
+    return triangles
+
+
+def vertex_normals(positions, triangles):
+    """Return normalized, area weighted vertex normals of a triangle mesh"""
+    normals = array.array('d', [0.0]) * len(positions)
+    for t in range(0, len(triangles), 3):
+        a, b, c = (triangles[t] * 3, triangles[t + 1] * 3,
+                   triangles[t + 2] * 3)
+        ab = [positions[b + k] - positions[a + k] for k in range(3)]
+        ac = [positions[c + k] - positions[a + k] for k in range(3)]
+        face = (ab[1] * ac[2] - ab[2] * ac[1],
+                ab[2] * ac[0] - ab[0] * ac[2],
+                ab[0] * ac[1] - ab[1] * ac[0])
+        for corner in (a, b, c):
+            for k in range(3):
+                normals[corner + k] += face[k]
+    for i in range(0, len(normals), 3):
+        length = math.sqrt(normals[i] ** 2 + normals[i + 1] ** 2 +
+                           normals[i + 2] ** 2) or 1.0
+        for k in range(3):
+            normals[i + k] /= length
+    return normals
+
+
+def grid_mesh(count):
+    """Return positions, normals and triangles of a flat grid of about count
+    vertices, one unit apart"""
+    columns, rows = _grid_size(count)
+    positions = array.array('d')
+    for j in range(rows):
+        for i in range(columns):
+            positions.extend((float(i), 0.0, float(j)))
+    normals = array.array('d', (0.0, 1.0, 0.0)) * (columns * rows)
+    return positions, normals, _grid_triangles(columns, rows)
+
+
+def sphere_mesh(count, radius=100.0):
+    """Return a UV sphere of about count vertices, the poles are rows of
+    coincident vertices like an unwelded sphere"""
+    columns, rows = _grid_size(count)
+    positions = array.array('d')
+    normals = array.array('d')
+    for j in range(rows):
+        theta = math.pi * j / (rows - 1)
+        for i in range(columns):
+            phi = 2.0 * math.pi * i / (columns - 1)
+            normal = (math.sin(theta) * math.cos(phi), math.cos(theta),
+                      math.sin(theta) * math.sin(phi))
+            normals.extend(normal)
+            positions.extend([radius * n for n in normal])
+    return positions, normals, _grid_triangles(columns, rows)
+
+
+def terrain_mesh(count, seed=0):
+    """Return a grid of about count vertices displaced by rolling hills and
+    per vertex noise"""
+    columns, rows = _grid_size(count)
+    key = scatter_engine.stream_key("terrain", seed)
+    positions = array.array('d')
+    for j in range(rows):
+        for i in range(columns):
+            height = (4.0 * math.sin(i * 0.05) * math.cos(j * 0.07) +
+                      1.5 * math.sin(i * 0.31 + j * 0.17) +
+                      scatter_engine.uniform_at(key, j * columns + i) * 0.5)
+            positions.extend((float(i), height, float(j)))
+    triangles = _grid_triangles(columns, rows)
+    return positions, vertex_normals(positions, triangles), triangles
+
+
+MESH_BUILDERS = {"grid": grid_mesh, "sphere": sphere_mesh,
+                 "terrain": terrain_mesh}
+
+
+def build_scene(shape, count):
+    """Return a MemoryBackend holding the destination mesh and a source"""
+    backend = scatter_backend.MemoryBackend()
+    backend.add_mesh(shape, *MESH_BUILDERS[shape](count))
+    cube = [-0.5, 0.5]
+    backend.add_mesh(SOURCE, [c for x in cube for y in cube for z in cube
+                              for c in (x, y, z)], [0.0, 1.0, 0.0] * 8, [])
+    return backend
+
+
+def run_phases(backend, shape, percent, distribution, workers, clock):
+    """Scatter once, returning {phase: (clock delta, points)}"""
+    scenefile = scatter_core.SceneFile(backend)
+    scenefile.cache = None
+    scenefile.workers = workers
+    scenefile.distribution = distribution
+    backend.select(SOURCE)
+    scenefile.set_scatter_source()
+    results = {}
+
+    def timed(phase, func, *args):
+        gc.collect()
+        start = clock.start()
+        value = func(*args)
+        results[phase] = clock.stop(start)
+        return value
+
+    backend.select(shape)
+    dest = timed("select", scenefile.set_scatter_dest)
+
+    def query():
+        for mesh in dest.meshes():
+            scenefile._mesh_arrays(mesh)
+            scenefile._mesh_triangles(mesh)
+
+    timed("query", query)
+    timed("sample", scenefile.sample_points, 0, percent)
+    transforms = timed("transform", scenefile.compute_transforms, 0, percent,
+                       ALIGN, SCALE, ROTATE, OFFSET, False)
+    # Forced modes, auto would switch to an instancer on the larger meshes
+    timed("instances", scenefile.scatter, 0, percent, ALIGN, SCALE, ROTATE,
+          OFFSET, False, "instances")
+    timed("instancer", scenefile.scatter, 0, percent, ALIGN, SCALE, ROTATE,
+          OFFSET, False, "instancer")
+    scenefile.close()
+    points = {"select": len(dest), "query": len(dest)}
+    for phase in ("sample", "transform", "instances", "instancer"):
+        points[phase] = len(transforms)
+    return dict((phase, (results[phase], points[phase])) for phase in PHASES)
+
+
+class WallClock(object):
+    """Measures the seconds a phase takes"""
+
+    def start(self):
+        return scatter_stats.timer()
+
+    def stop(self, start):
+        return scatter_stats.timer() - start
+
+
+class PeakMemory(object):
+    """Measures the peak of what a phase allocates, in bytes
+
+    Tracing restarts for every phase, which clears the peak on any Python 3
+    and leaves out what was allocated before.
+    """
+
+    def start(self):
+        tracemalloc.stop()
+        tracemalloc.start()
+        return 0
+
+    def stop(self, start):
+        return tracemalloc.get_traced_memory()[1] - start
+
+
+def benchmark(shapes=SHAPES, sizes=SIZES, percent=1.0,
+              distribution="vertices", workers=1, repeat=1, memory=True,
+              log=None):
+    """Return a record per shape, size and phase"""
+    records = []
+    for shape in shapes:
+        for size in sizes:
+            timings = None
+            for _ in range(repeat):
+                backend = build_scene(shape, size)
+                run = run_phases(backend, shape, percent, distribution,
+                                 workers, WallClock())
+                if timings is None:
+                    timings = run
+                else:
+                    timings = dict((phase, min(timings[phase], run[phase]))
+                                   for phase in PHASES)
+                del backend
+            peaks = {}
+            if memory and tracemalloc is not None:
+                backend = build_scene(shape, size)
+                tracemalloc.start()
+                try:
+                    peaks = run_phases(backend, shape, percent,
+                                       distribution, workers, PeakMemory())
+                finally:
+                    tracemalloc.stop()
+                del backend
+            for phase in PHASES:
+                seconds, points = timings[phase]
+                record = {
+                    "shape": shape,
+                    "size": size,
+                    "phase": phase,
+                    "points": points,
+                    "seconds": round(seconds, 6),
+                    "points_per_second": round(points / seconds, 1)
+                    if seconds else None,
+                    "peak_bytes": peaks[phase][0] if peaks else None,
+                }
+                records.append(record)
+                if log is not None:
+                    log(record)
+    return records
+
+
+def _git_commit():
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"],
+            stderr=subprocess.STDOUT).decode("utf-8").strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _print_record(record):
+    print("{0:8} {1:>8} {2:10} {3:>10.4f}s {4!s:>12} pts/s {5!s:>12} bytes".format(
+        record["shape"], record["size"], record["phase"], record["seconds"],
+        record["points_per_second"], record["peak_bytes"]))
+
+
+def compare(records, baseline):
+    """Print the time of every record against the same one in baseline"""
+    previous = dict(((r["shape"], r["size"], r["phase"]), r)
+                    for r in baseline["results"])
+    print("{0:8} {1:>8} {2:10} {3:>10} {4:>10} {5:>7}".format(
+        "shape", "size", "phase", "before", "after", "ratio"))
+    for record in records:
+        old = previous.get((record["shape"], record["size"], record["phase"]))
+        if old is None:
+            continue
+        ratio = (record["seconds"] / old["seconds"]
+                 if old["seconds"] else float("nan"))
+        print("{0:8} {1:>8} {2:10} {3:>10.4f} {4:>10.4f} {5:>7.2f}".format(
+            record["shape"], record["size"], record["phase"],
+            old["seconds"], record["seconds"], ratio))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--shapes", nargs="+", choices=SHAPES,
+                        default=SHAPES)
+    parser.add_argument("--sizes", nargs="+", type=int, default=SIZES)
+    parser.add_argument("--percent", type=float, default=1.0,
+                        help="fraction of the vertices to scatter on")
+    parser.add_argument("--distribution",
+                        choices=scatter_core.DISTRIBUTIONS,
+                        default="vertices")
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument("--no-memory", dest="memory", action="store_false",
+                        help="skip the traced run for peak memory")
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--compare", help="JSON file of an earlier run")
+    args = parser.parse_args(argv)
+    records = benchmark(args.shapes, args.sizes, args.percent,
+                        args.distribution, args.workers, args.repeat,
+                        args.memory, _print_record)
+    result = {
+        "meta": {
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "date": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "settings": {"percent": args.percent,
+                         "distribution": args.distribution,
+                         "workers": args.workers, "repeat": args.repeat},
+        },
+        "results": records,
+    }
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump(result, output, indent=1, sort_keys=True)
+    if args.compare:
+        with open(args.compare) as baseline:
+            compare(records, json.load(baseline))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
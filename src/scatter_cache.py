@@ -0,0 +1,224 @@
+"""Disk cache of computed scatter transforms
+
+Results are stored one file per key in a flat binary layout that can be
+memory mapped back in:
+
+    header      struct HEADER: magic, version, point count, mesh table size
+    matrices    point count * 16 little endian doubles
+    normals     point count * 3 doubles, the normal each point was built on
+    mesh ids    point count uint32, index into the mesh table
+    point ids   point count int64, vertex or sample id of each point
+    mesh table  utf-8 mesh names joined by newlines
+
+The matrices and normals come first, right after the fixed size header, so
+they are 8 byte aligned and can be read straight out of the map. Like scatter_engine
+this has no Maya imports.
+"""
+import array
+import hashlib
+import logging
+import mmap
+import os
+import struct
+import tempfile
+import time
+
+import scatter_engine
+
+log = logging.getLogger(__name__)
+
+MAGIC = b"SCTR"
+# Bump when the file layout or the scatter math changes, so old files miss
+CACHE_VERSION = 2
+HEADER = struct.Struct("<4sHHQQ")
+EXTENSION = ".sctr"
+DEFAULT_FOLDER = os.environ.get(
+    "SCATTER_CACHE_DIR", os.path.join(tempfile.gettempdir(), "scatter_cache"))
+# Least recently used files are deleted once the folder is bigger than this
+MAX_CACHE_SIZE = 2 * 1024 ** 3
+TEMP_EXTENSION = ".tmp"
+# Seconds after which a temporary file is taken as left by a crashed store
+STALE_TEMP_AGE = 60 * 60
+
+
+def to_bytes(values):
+    """Return the raw bytes of an array.array on Python 2 and 3"""
+    if hasattr(values, "tobytes"):
+        return values.tobytes()
+    return values.tostring()
+
+
+def typed_view(buffer, offset, count, typecode):
+    """Return count values of an array typecode from offset of buffer
+    without copying them
+
+    Python 2 memoryviews can't be cast, nor made of an mmap, there the
+    values are sliced out of the buffer into an array instead.
+    """
+    end = offset + count * array.array(typecode).itemsize
+    if hasattr(memoryview, "cast"):
+        return memoryview(buffer)[offset:end].cast(typecode)
+    values = array.array(typecode)
+    values.fromstring(buffer[offset:end])
+    return values
+
+
+def double_view(buffer, offset, count):
+    """Return count doubles of buffer from offset without copying them"""
+    return typed_view(buffer, offset, count, "d")
+
+
+def _remove(path):
+    """Delete path, leaving it when that fails"""
+    try:
+        os.remove(path)
+    except OSError:
+        # Gone already, or still mapped by another process on Windows
+        return False
+    return True
+
+
+def digest(*parts):
+    """Return a sha1 hex digest of strings, numbers, arrays and sequences"""
+    sha = hashlib.sha1()
+    for part in parts:
+        if isinstance(part, array.array):
+            sha.update(to_bytes(part))
+        elif isinstance(part, (list, tuple)):
+            sha.update(digest(*part).encode("utf-8"))
+        else:
+            sha.update(repr(part).encode("utf-8"))
+        sha.update(b"|")
+    return sha.hexdigest()
+
+
+def write_transforms(path, keys, transforms, normals):
+    """Write (mesh, id) keys, their TransformBatch and flat normals to
+    path"""
+    mesh_index = {}
+    meshes = []
+    mesh_ids = array.array("I")
+    for mesh, _ in keys:
+        if mesh not in mesh_index:
+            mesh_index[mesh] = len(meshes)
+            meshes.append(mesh)
+        mesh_ids.append(mesh_index[mesh])
+    mesh_table = "\n".join(meshes).encode("utf-8")
+    count = len(keys)
+    matrices = transforms.matrices
+    if not isinstance(matrices, array.array):
+        matrices = array.array("d", matrices)
+    if not isinstance(normals, array.array):
+        normals = array.array("d", normals)
+    with open(path, "wb") as cache_file:
+        cache_file.write(HEADER.pack(MAGIC, CACHE_VERSION, 0, count,
+                                     len(mesh_table)))
+        cache_file.write(to_bytes(matrices))
+        cache_file.write(to_bytes(normals))
+        cache_file.write(struct.pack("<{0}I".format(count), *mesh_ids))
+        cache_file.write(struct.pack("<{0}q".format(count),
+                                     *[point_id for _, point_id in keys]))
+        cache_file.write(mesh_table)
+
+
+def read_transforms(path):
+    """Map the file at path and return its (keys, TransformBatch, normals)
+
+    The matrices of the batch and the normals are views into the map, the
+    keys are read.
+    """
+    with open(path, "rb") as cache_file:
+        data = mmap.mmap(cache_file.fileno(), 0, access=mmap.ACCESS_READ)
+    magic, version, _, count, table_size = HEADER.unpack_from(data, 0)
+    if magic != MAGIC or version != CACHE_VERSION:
+        raise ValueError("Not a scatter cache file: {0}".format(path))
+    offset = HEADER.size
+    matrices = double_view(data, offset, count * 16)
+    offset += count * 16 * 8
+    normals = double_view(data, offset, count * 3)
+    offset += count * 3 * 8
+    mesh_ids = struct.unpack_from("<{0}I".format(count), data, offset)
+    offset += count * 4
+    point_ids = struct.unpack_from("<{0}q".format(count), data, offset)
+    offset += count * 8
+    meshes = data[offset:offset + table_size].decode("utf-8").split("\n")
+    keys = [(meshes[mesh_id], point_id)
+            for mesh_id, point_id in zip(mesh_ids, point_ids)]
+    return keys, scatter_engine.TransformBatch(matrices), normals
+
+
+class TransformCache(object):
+    """A size capped, least recently used folder of scatter results"""
+
+    def __init__(self, folder=DEFAULT_FOLDER, max_size=MAX_CACHE_SIZE):
+        self.folder = folder
+        self.max_size = max_size
+
+    def _path(self, key):
+        return os.path.join(self.folder, key + EXTENSION)
+
+    def load(self, key):
+        """Return the cached (keys, TransformBatch, normals) of key, or
+        None"""
+        path = self._path(key)
+        if not os.path.exists(path):
+            return None
+        try:
+            result = read_transforms(path)
+        except (IOError, OSError, TypeError, ValueError,
+                struct.error) as error:
+            log.warning("Ignoring unreadable scatter cache %s: %s",
+                        path, error)
+            return None
+        # The modified time doubles as the last use time for eviction
+        try:
+            os.utime(path, None)
+        except OSError as error:
+            log.debug("Could not touch scatter cache %s: %s", path, error)
+        return result
+
+    def store(self, key, keys, transforms, normals):
+        """Write the result of key to the cache and evict over the cap"""
+        if not os.path.isdir(self.folder):
+            os.makedirs(self.folder)
+        path = self._path(key)
+        temp_path = "{0}.{1}{2}".format(path, os.getpid(), TEMP_EXTENSION)
+        try:
+            write_transforms(temp_path, keys, transforms, normals)
+            if os.path.exists(path):
+                os.remove(path)
+            os.rename(temp_path, path)
+        except Exception:
+            _remove(temp_path)
+            raise
+        self.evict()
+
+    def evict(self):
+        """Delete the least recently used files until under max_size, and
+        temporary files a crashed store left behind"""
+        entries = []
+        stale_time = time.time() - STALE_TEMP_AGE
+        for name in os.listdir(self.folder):
+            # Temporary files are named <key>.sctr.<pid>.tmp
+            is_temp = (name.endswith(TEMP_EXTENSION) and
+                       EXTENSION + "." in name)
+            if not (is_temp or name.endswith(EXTENSION)):
+                continue
+            path = os.path.join(self.folder, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                # Removed by another session since the listing
+                continue
+            if is_temp:
+                # Another session may still be writing a recent one
+                if stat.st_mtime < stale_time:
+                    _remove(path)
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_size:
+                break
+            if _remove(path):
+                total -= size
@@ -0,0 +1,968 @@
+"""Scatter core
+
+SceneFile samples the destination, builds the transforms and writes the
+instances, reaching the scene only through a scatter_backend.SceneBackend.
+Nothing in here imports Maya, so with a MemoryBackend a scatter runs in a
+plain Python process.
+"""
+import array
+import collections
+import contextlib
+import logging
+import multiprocessing
+
+import scatter_cache
+import scatter_engine
+import scatter_geometry
+import scatter_pointcache
+import scatter_stats
+
+log = logging.getLogger(__name__)
+
+SCATTER_MODES = ["auto", "instances", "instancer"]
+# Place on the destination vertices, randomly by face area or Poisson disk
+DISTRIBUTIONS = ["vertices", "area", "poisson"]
+# Above this many points "auto" writes an instancer instead of transforms
+INSTANCER_THRESHOLD = 1000
+# Number of instances created per backend call
+BATCH_SIZE = 500
+# Below this many points the per mesh compute runs serially, a worker pool
+# costs more to start than it saves
+PARALLEL_THRESHOLD = 20000
+# Number of ScatterStats a SceneFile keeps
+STATS_HISTORY = 50
+# How the viewport draws a scatter, "bbox" draws every instance as its
+# bounding box, renders always get the real geometry
+DISPLAY_MODES = ["auto", "full", "bbox"]
+# Above this many points "auto" draws a scatter as bounding boxes
+DISPLAY_THRESHOLD = 2000
+
+
+def iter_update_instances(backend, sources, transforms, keys, point_sources,
+                          instance_map, group, batch_size=BATCH_SIZE):
+    """Bring the instances in instance_map in line with transforms
+
+    keys[i] names the destination point of transforms[i] and
+    sources[point_sources[i]] the object instanced there. instance_map maps
+    each key to its (node, source). Instances already mapped to a key with
+    the same source keep their node and only get the new matrix, missing
+    ones are instanced under group, and instances whose key is gone or whose
+    source changed are deleted.
+
+    Points are written grouped by source, so a batch mostly instances a
+    single source in one backend call. instance_map is updated as this goes,
+    a batch at a time, and every batch is complete when it is yielded, so
+    stopping between batches leaves a consistent partial result.
+
+    Yields:
+        int: the number of points done
+    """
+    wanted = dict((key, sources[source])
+                  for key, source in zip(keys, point_sources))
+    surplus = [key for key, (_, source) in instance_map.items()
+               if wanted.get(key) != source]
+    surplus_nodes = [instance_map.pop(key)[0] for key in surplus]
+    surplus_nodes = [node for node in surplus_nodes if backend.exists(node)]
+    if surplus_nodes:
+        backend.delete(surplus_nodes)
+    order = sorted(range(len(keys)), key=point_sources.__getitem__)
+    for start in range(0, len(order), batch_size):
+        batch = order[start:start + batch_size]
+        missing = {}
+        for i in batch:
+            key = keys[i]
+            if key not in instance_map or not backend.exists(
+                    instance_map[key][0]):
+                missing.setdefault(point_sources[i], []).append(key)
+        for source_index, source_keys in sorted(missing.items()):
+            source = sources[source_index]
+            nodes = backend.create_instances(source, len(source_keys), group)
+            instance_map.update((key, (node, source))
+                                for key, node in zip(source_keys, nodes))
+        backend.set_transforms([instance_map[keys[i]][0] for i in batch],
+                               [transforms.matrix(i) for i in batch])
+        yield start + len(batch)
+
+
+def create_instances(backend, sources, transforms, point_sources=None,
+                     name="scatter_grp", batch_size=BATCH_SIZE):
+    """Instance sources at every transform under a single new group, point
+    i getting sources[point_sources[i]], or the first source without them
+
+    Returns:
+        tuple: the group and the list of instance names
+    """
+    group = backend.create_group(name)
+    keys = list(range(len(transforms)))
+    if point_sources is None:
+        point_sources = [0] * len(keys)
+    instance_map = {}
+    for _ in iter_update_instances(backend, sources, transforms, keys,
+                                   point_sources, instance_map, group,
+                                   batch_size):
+        pass
+    return group, [instance_map[key][0] for key in keys]
+
+
+class SceneFile(object):
+
+    """Scenfile Operations
+
+    All scene access goes through self.backend, a SceneBackend. It defaults
+    to the open Maya scene, pass a scatter_backend.MemoryBackend to scatter
+    without Maya.
+
+    With recordStats on, or the scatter_stats logger enabled for DEBUG, every
+    operation records a scatter_stats.ScatterStats into self.stats and logs
+    it. Off, the operations skip the timing and use the backend directly.
+    """
+
+    def __init__(self, backend=None):
+        if backend is None:
+            import scatter_maya
+            backend = scatter_maya.MayaBackend()
+        self.backend = backend
+        self.sources = []
+        self.sourceWeights = []
+        self.destSel = None
+        self.scatterNode = None
+        self.scatterMode = None
+        self.scatterSources = None
+        self.scatterDest = None
+        self.scatterMap = {}
+        self.scatterPoints = None
+        self._rollbackState = None
+        self.previewNode = None
+        self.previewProxies = []
+        self.displayMode = "auto"
+        self.displayThreshold = DISPLAY_THRESHOLD
+        self.displayDistance = 0.0
+        self._displayNodes = []
+        self.distribution = "vertices"
+        self.spacing = 1.0
+        self.avoidOverlap = False
+        self.workers = multiprocessing.cpu_count()
+        self._pool = None
+        self._poolSize = 0
+        self.cache = scatter_cache.TransformCache()
+        self.geometry = scatter_geometry.GeometryCache(backend)
+        self.densityMap = None
+        self._densityVersion = 0
+        self._weights = {}
+        self._selectionKeys = {}
+        self._sampleKey = None
+        self._samples = None
+        self._transformKey = None
+        self._transforms = None
+        self._transformKeys = None
+        self._transformNormals = None
+        # Disk cache key of transforms computed but not written yet
+        self._unstoredKey = None
+        self._scatterNormals = None
+        self._sourceRadius = None
+        self.recordStats = False
+        self.stats = collections.deque(maxlen=STATS_HISTORY)
+        self._stats = None
+
+    @contextlib.contextmanager
+    def _recording(self, operation):
+        """Record the block as operation, an operation run inside another
+        one counts towards the outer one"""
+        if (self._stats is not None or
+                not scatter_stats.enabled(self.recordStats)):
+            yield
+            return
+        stats = scatter_stats.ScatterStats(operation)
+        backend = self.backend
+        commands = backend.commands
+        self._stats = stats
+        self.backend = scatter_stats.InstrumentedBackend(backend, stats)
+        try:
+            yield
+        finally:
+            self.backend = backend
+            self._stats = None
+            stats.count("scene_commands", backend.commands - commands)
+            stats.finish()
+            self.stats.append(stats)
+            scatter_stats.log.debug(stats.to_json())
+
+    def _phase(self, name):
+        if self._stats is None:
+            return scatter_stats.NULL_PHASE
+        return self._stats.phase(name)
+
+    def _count(self, name, amount=1):
+        if self._stats is not None:
+            self._stats.count(name, amount)
+
+    def export_stats(self, path):
+        """Write the recorded stats to path as JSON"""
+        scatter_stats.export_json(self.stats, path)
+
+    def set_scatter_source(self):
+        """Scatter every selected object, all weighted 1 to start with
+
+        Set sourceWeights to change how often each one is picked.
+        """
+        self.clear_preview()
+        self.sources = self.backend.selection()
+        self.sourceWeights = [1.0] * len(self.sources)
+        self._sourceRadius = None
+        self._transformKey = None
+        return self.sources
+
+    def set_scatter_dest(self):
+        with self._recording("set_scatter_dest"), self._phase("select"):
+            self.destSel = self.backend.vertex_selection(
+                self.backend.selection())
+            self._count("vertices", len(self.destSel))
+        self._selectionKeys = {}
+        self._sampleKey = None
+        self._transformKey = None
+        return self.destSel
+
+    def _geometry(self, mesh):
+        """Return the MeshGeometry of mesh, only reading it from the scene
+        when self.geometry has none"""
+        geometry = self.geometry.get(mesh)
+        if geometry is None:
+            positions, normals = self.backend.mesh_arrays(mesh)
+            geometry = self.geometry.put(mesh, scatter_geometry.MeshGeometry(
+                positions, normals, self.backend.mesh_triangles(mesh)))
+            self._count("geometry_reads")
+        return geometry
+
+    def _selection_key(self, mesh):
+        if mesh not in self._selectionKeys:
+            self._selectionKeys[mesh] = scatter_cache.digest(
+                self.destSel.indices(mesh))
+        return self._selectionKeys[mesh]
+
+    def _derived(self, mesh, name):
+        """Return what was derived as name from mesh and its selected
+        vertices, or None"""
+        return self._geometry(mesh).derived.get(
+            (name, self._selection_key(mesh)))
+
+    def _derive(self, mesh, name, value):
+        return self.geometry.add_derived(
+            mesh, (name, self._selection_key(mesh)), value)
+
+    def _scene_versions(self):
+        """Return what changes with every read of the destination meshes or
+        the density map"""
+        return (self._densityVersion,) + tuple(
+            self._geometry(mesh).version for mesh in self.destSel.meshes())
+
+    def set_density_map(self, density_map):
+        """Weight the scatter density by density_map, a vertex color set or
+        a 2D texture, None scatters evenly
+
+        The map is read again on the next scatter even with the same name,
+        call this after painting a texture. Color sets are also read again
+        whenever their mesh changes.
+
+        Raises:
+            ValueError: a destination mesh has no such color set and it is
+                no texture either, the scatter is left even
+        """
+        self.densityMap = density_map or None
+        self._densityVersion += 1
+        self._weights = {}
+        if self.densityMap is not None and self.destSel is not None:
+            try:
+                for mesh in self.destSel.meshes():
+                    self._read_weights(mesh)
+            except ValueError:
+                self.densityMap = None
+                self._weights = {}
+                raise
+        return self.densityMap
+
+    def _vertex_weights(self, mesh):
+        """Return the densityMap weight of every vertex of mesh"""
+        return self._read_weights(mesh)[0]
+
+    def _read_weights(self, mesh):
+        """Return the weights of mesh and their digest, read in one backend
+        call per map and mesh geometry"""
+        version = self._geometry(mesh).version
+        if self._weights.get(mesh, (None,))[0] != version:
+            weights = self.backend.vertex_weights(mesh, self.densityMap)
+            self._weights[mesh] = (version, weights,
+                                   scatter_cache.digest(weights))
+            self._count("weight_reads")
+        return self._weights[mesh][1:]
+
+    def _mesh_arrays(self, mesh):
+        geometry = self._geometry(mesh)
+        return geometry.positions, geometry.normals
+
+    def _mesh_triangles(self, mesh):
+        """Return the triangles of mesh with every corner in destSel"""
+        triangles = self._derived(mesh, "triangles")
+        if triangles is None:
+            geometry = self._geometry(mesh)
+            triangles = geometry.triangles
+            selected = self.destSel.indices(mesh)
+            if len(selected) < geometry.vertex_count():
+                selected = set(selected)
+                kept = array.array('l')
+                for t in range(0, len(triangles), 3):
+                    corners = triangles[t:t + 3]
+                    if (corners[0] in selected and corners[1] in selected and
+                            corners[2] in selected):
+                        kept.extend(corners)
+                triangles = kept
+            triangles = self._derive(mesh, "triangles", triangles)
+        return triangles
+
+    def _gather_points(self, mesh, vertices):
+        """Return flat positions and normals for (mesh, vertex id) pairs of
+        one mesh"""
+        positions = array.array('d')
+        normals = array.array('d')
+        mesh_positions, mesh_normals = self._mesh_arrays(mesh)
+        for _, index in vertices:
+            positions.extend(mesh_positions[index * 3:index * 3 + 3])
+            normals.extend(mesh_normals[index * 3:index * 3 + 3])
+        return positions, normals
+
+    def _workers(self, count):
+        if count < PARALLEL_THRESHOLD or self.workers <= 1:
+            return 1
+        return self.workers
+
+    def _map(self, func, jobs, workers):
+        """map_parallel on the pool of self.workers processes, started on
+        first use and kept running until close
+
+        Workers are spawned where Python can. Where it can only fork, and
+        the backend must not be forked, everything runs here serially.
+        """
+        if workers > 1 and len(jobs) > 1 and self._poolSize != self.workers:
+            self.close()
+            self.backend.prepare_workers()
+            self._pool = scatter_engine.start_pool(self.workers,
+                                                   self.backend.can_fork())
+            self._poolSize = self.workers
+            if self._pool is None:
+                log.info("Worker processes can't be spawned here, the "
+                         "scatter runs in this process")
+        if self._pool is None:
+            workers = 1
+        return scatter_engine.map_parallel(func, jobs, workers, self._pool)
+
+    def close(self):
+        """Stop the worker pool, the next parallel compute starts a new one"""
+        if self._pool is not None:
+            self._pool.close()
+            self._pool.join()
+        self._pool = None
+        self._poolSize = 0
+
+    def _sample_vertices(self, seed, count):
+        """Return a (keys, positions, normals) sample per destination mesh"""
+        sample = scatter_engine.sample_indices(len(self.destSel), count, seed)
+        # Refactor prcnt_select to use a flag instead of always running?
+        by_mesh = {}
+        for i in sample:
+            mesh, index = self.destSel[i]
+            by_mesh.setdefault(mesh, []).append((mesh, index))
+        samples = []
+        for mesh in self.destSel.meshes():
+            if mesh in by_mesh:
+                positions, normals = self._gather_points(mesh,
+                                                         by_mesh[mesh])
+                samples.append((by_mesh[mesh], positions, normals))
+        return samples
+
+    def _sample_density(self, seed, percent):
+        """Return a (keys, positions, normals) sample per destination mesh
+        with every vertex kept by percent times its densityMap weight"""
+        samples = []
+        for mesh in self.destSel.meshes():
+            kept = scatter_engine.thin_vertices(
+                mesh, self.destSel.indices(mesh), self._vertex_weights(mesh),
+                percent, seed)
+            if kept:
+                keys = [(mesh, index) for index in kept]
+                positions, normals = self._gather_points(mesh, keys)
+                samples.append((keys, positions, normals))
+        return samples
+
+    def _sampling_tables(self, meshes, workers):
+        """Return the triangle areas and AliasTable of every mesh, weighted
+        by densityMap when there is one"""
+        tables = dict((mesh, self._derived(mesh, "sampling"))
+                      for mesh in meshes)
+        missing = [mesh for mesh in meshes if tables[mesh] is None]
+        built = self._map(
+            scatter_engine.sampling_table,
+            [(self._mesh_arrays(mesh)[0], self._mesh_triangles(mesh))
+             for mesh in missing], workers)
+        for mesh, table in zip(missing, built):
+            tables[mesh] = self._derive(mesh, "sampling", table)
+        if self.densityMap is None:
+            return tables
+        weighted = self._map(
+            scatter_engine.weighted_sampling_table,
+            [(tables[mesh][0], self._mesh_triangles(mesh),
+              self._vertex_weights(mesh)) for mesh in meshes], workers)
+        return dict(zip(meshes, weighted))
+
+    def _sample_surface(self, seed, count):
+        """Spread count points over the destination faces
+
+        Points are shared between meshes by surface area, then every mesh is
+        sampled with its own seeded stream, on the worker pool when there are
+        enough points. The triangle areas and their alias table are built
+        once per mesh geometry and selection, with a density map their
+        areas are scaled by the mean weight of the corners.
+
+        Returns:
+            list: a (keys, positions, normals) sample per destination mesh
+        """
+        meshes = self.destSel.meshes()
+        workers = self._workers(count)
+        tables = self._sampling_tables(meshes, workers)
+        counts = scatter_engine.allocate_counts(
+            [sum(tables[mesh][0]) for mesh in meshes], count)
+        jobs = []
+        for mesh, mesh_count in zip(meshes, counts):
+            positions, normals = self._mesh_arrays(mesh)
+            areas, table = tables[mesh]
+            jobs.append((mesh, positions, normals, self._mesh_triangles(mesh),
+                         areas, table, mesh_count, self.distribution,
+                         self.spacing, seed))
+        return self._map(scatter_engine.sample_mesh, jobs, workers)
+
+    def _sample_key(self, seed, percent):
+        return (seed, percent, self.distribution, self.spacing,
+                self.densityMap)
+
+    def sample_points(self, seed, percent):
+        """Return a (keys, positions, normals) sample per destination mesh
+
+        The sample is kept until the seed, percentage, distribution or
+        spacing change, or a destination mesh or the density map does.
+
+        With a densityMap the percentage is the density where the weight is
+        1: a vertex is kept with probability percent * weight, and surface
+        distributions place percent of the summed vertex weights by area
+        times weight. Only the points that survive the weighting are ever
+        built.
+        """
+        sample_key = (self._sample_key(seed, percent),
+                      self._scene_versions())
+        if sample_key != self._sampleKey:
+            random_amount = int(round(len(self.destSel) * percent))
+            # The vertex distribution thins by the weights directly
+            if (self.densityMap is not None and
+                    self.distribution != "vertices"):
+                random_amount = int(round(sum(
+                    sum(self._vertex_weights(mesh)[i]
+                        for i in self.destSel.indices(mesh))
+                    for mesh in self.destSel.meshes()) * percent))
+            if self.distribution == "vertices" and self.densityMap:
+                self._samples = self._sample_density(seed, percent)
+            elif self.distribution == "vertices":
+                self._samples = self._sample_vertices(seed, random_amount)
+            else:
+                self._samples = self._sample_surface(seed, random_amount)
+            self._sampleKey = sample_key
+        return self._samples
+
+    def compute_transforms(self, seed, percent, align, scale,
+                           rotate, offset, relativeOffset, store=True):
+        """Return the TransformBatch for these settings
+
+        Each stage keeps its last result and only reruns when its own inputs
+        change: the sample and its positions and normals depend on the seed,
+        percentage and distribution, the transforms on everything. Mesh
+        arrays, and the triangles and tables derived from them, come from
+        self.geometry, which keeps them until the mesh changes in the scene,
+        so changing the settings never re-queries them. With avoidOverlap,
+        points whose instance would overlap an earlier one are dropped after
+        the transforms are built.
+
+        Sampling, transforms and overlap rejection run per destination mesh,
+        on a pool of self.workers processes for large scatters. Only the
+        mesh queries stay on the main thread and the per mesh results are
+        merged in destination order. With several meshes one more overlap
+        pass then runs over the merged points, across the mesh seams.
+
+        Results are also kept in self.cache on disk, keyed by the settings
+        and a hash of every destination mesh, so running the same scatter
+        again, even in a later session, skips straight to the transforms.
+        Set self.cache to None to turn that off. With store off a new result
+        is only read from there, it is written once a call with store on
+        asks for it.
+
+        The percentage is of the destination vertex count, also when points
+        are spread over the faces by area or Poisson disk.
+        """
+        with self._recording("compute"):
+            transforms = self._compute_transforms(
+                seed, percent, align, scale, rotate, offset, relativeOffset)
+            if store:
+                self._store_transforms()
+            return transforms
+
+    def _compute_transforms(self, seed, percent, align, scale,
+                            rotate, offset, relativeOffset):
+        sample_key = self._sample_key(seed, percent)
+        transform_key = (sample_key, align, tuple(scale), tuple(rotate),
+                         tuple(offset), relativeOffset, self.avoidOverlap)
+        # Versions change with every read of a mesh, they only key the
+        # results kept here and not the ones on disk
+        versions = self._scene_versions()
+        if (transform_key, versions) == self._transformKey:
+            return self._transforms
+        radius = 0.0
+        if self.avoidOverlap:
+            # The largest source keeps every pair apart whichever sources
+            # end up on them
+            if self._sourceRadius is None:
+                self._sourceRadius = max(self.backend.bounding_radius(source)
+                                         for source in self.sources)
+            radius = self._sourceRadius
+        cache_key = None
+        if self.cache is not None:
+            with self._phase("cache_load"):
+                cache_key = self._cache_key(transform_key, radius)
+                cached = self.cache.load(cache_key)
+            if cached is not None:
+                self._count("cache_hits")
+                (self._transformKeys, self._transforms,
+                 self._transformNormals) = cached
+                self._transformKey = (transform_key, versions)
+                self._unstoredKey = None
+                return self._transforms
+        with self._phase("sample"):
+            samples = self.sample_points(seed, percent)
+        jobs = [(keys, positions, normals, scale, rotate, offset, align,
+                 relativeOffset, seed, radius)
+                for keys, positions, normals in samples]
+        total = sum(len(job[0]) for job in jobs)
+        with self._phase("transform"):
+            results = self._map(scatter_engine.transform_mesh, jobs,
+                                self._workers(total))
+            keys = []
+            transforms = scatter_engine.TransformBatch()
+            normals = array.array('d')
+            for mesh_keys, matrices, mesh_normals in results:
+                keys.extend(mesh_keys)
+                transforms.matrices.extend(matrices)
+                normals.extend(mesh_normals)
+        if radius > 0.0 and len(results) > 1:
+            # Each mesh was only cleared against itself, instances either
+            # side of a seam between meshes can still touch
+            with self._phase("overlap"):
+                kept = scatter_engine.reject_overlaps(transforms, radius)
+                transforms = transforms.subset(kept)
+                keys = [keys[i] for i in kept]
+                normals = scatter_engine.gather_vectors(normals, kept)
+        self._count("points", len(keys))
+        self._transforms = transforms
+        self._transformKeys = keys
+        self._transformNormals = normals
+        self._transformKey = (transform_key, versions)
+        self._unstoredKey = cache_key
+        return self._transforms
+
+    def _store_transforms(self):
+        """Write the last computed transforms to self.cache, unless they
+        came from there or are already written"""
+        if self._unstoredKey is None or self.cache is None:
+            return
+        try:
+            with self._phase("cache_store"):
+                self.cache.store(self._unstoredKey, self._transformKeys,
+                                 self._transforms, self._transformNormals)
+        except (IOError, OSError) as error:
+            log.warning("Could not cache the scatter: %s", error)
+        self._unstoredKey = None
+
+    def assign_sources(self, seed):
+        """Return the index into sources picked for every computed point
+
+        The pick only depends on the seed, the point and sourceWeights, so
+        one sample and one set of transforms serve every source.
+        """
+        with self._phase("assign"):
+            return scatter_engine.choose_sources(
+                self._transformKeys, self.sourceWeights, seed)
+
+    def _mesh_digest(self, mesh):
+        """Hash what a scatter reads from mesh: its points, normals,
+        triangles and the selected vertex ids"""
+        mesh_digest = self._derived(mesh, "digest")
+        if mesh_digest is None:
+            positions, normals = self._mesh_arrays(mesh)
+            mesh_digest = self._derive(mesh, "digest", scatter_cache.digest(
+                mesh, positions, normals, self._mesh_triangles(mesh),
+                self.destSel.indices(mesh)))
+        return mesh_digest
+
+    def _cache_key(self, transform_key, radius):
+        weights = []
+        if self.densityMap is not None:
+            weights = [self._read_weights(mesh)[1]
+                       for mesh in self.destSel.meshes()]
+        return scatter_cache.digest(
+            transform_key, radius,
+            [self._mesh_digest(mesh) for mesh in self.destSel.meshes()],
+            weights)
+
+    def preview(self, seed, percent, align, scale,
+                rotate, offset, relativeOffset):
+        """Draw a box per point through one instancer, outside of undo, with
+        a box the size of each source
+
+        Previews never write to the disk cache, every settings change would
+        leave a file behind.
+        """
+        with self._recording("preview"):
+            transforms = self.compute_transforms(
+                seed, percent, align, scale, rotate, offset, relativeOffset,
+                store=False)
+            point_sources = self.assign_sources(seed)
+            backend = self.backend
+            with backend.no_undo(), self._phase("write"):
+                if (not self.previewNode or
+                        not backend.exists(self.previewNode)):
+                    self.previewProxies = [
+                        backend.create_proxy(source, "scatter_preview_proxy")
+                        for source in self.sources]
+                    self.previewNode = backend.create_instancer(
+                        self.previewProxies, "scatter_preview")
+                backend.set_instancer_points(self.previewNode, transforms,
+                                             point_sources)
+
+    def clear_preview(self):
+        with self.backend.no_undo():
+            for node in [self.previewNode] + self.previewProxies:
+                if node and self.backend.exists(node):
+                    self.backend.delete([node])
+        self.previewNode = None
+        self.previewProxies = []
+
+    def scatter(self, seed, percent, align, scale,
+                rotate, offset, relativeOffset, mode="auto", update=False):
+        """Scatter in one go, returning the scatter group or instancer"""
+        for _ in self.scatter_iter(seed, percent, align, scale, rotate,
+                                   offset, relativeOffset, mode, update):
+            pass
+        return self.scatterNode
+
+    def _dest_key(self):
+        """Return the destination meshes with a digest of their selected
+        vertex ids"""
+        return tuple((mesh, self._selection_key(mesh))
+                     for mesh in self.destSel.meshes())
+
+    def _can_update(self, mode):
+        # Points of another destination would all count as surplus and the
+        # previous scatter would be deleted
+        return (self.scatterNode is not None and
+                self.backend.exists(self.scatterNode) and
+                self.scatterMode == mode and
+                self.scatterDest == self._dest_key() and
+                (mode == "instances" or self.scatterSources == self.sources))
+
+    def scatter_iter(self, seed, percent, align, scale,
+                     rotate, offset, relativeOffset, mode="auto", update=False):
+        """Scatter a batch at a time
+
+        Every point gets one of sources, picked by sourceWeights. In
+        instances mode each point becomes an instance of its source under
+        the scatter group, in instancer mode one instancer draws them all.
+        With update, the previous scatter is changed in place when it used
+        the same mode and destination, and for an instancer the same
+        sources: instances keep their nodes and get new transforms, only
+        missing points are instanced and only surplus ones, or ones whose
+        source changed, are deleted. The scene writes stay in one undo chunk
+        until the generator finishes or is closed, so a cancelled scatter
+        still undoes in one step.
+
+        Stats of the scatter are recorded when the generator finishes or is
+        closed. Their "write" phase is wall time, so it includes the time
+        spent between batches.
+
+        Yields:
+            tuple: the number of points done and the total
+        """
+        with self._recording("scatter"):
+            steps = self._scatter_iter(seed, percent, align, scale, rotate,
+                                       offset, relativeOffset, mode, update)
+            try:
+                for progress in steps:
+                    yield progress
+            finally:
+                # Closes the undo chunk before the stats stop recording
+                steps.close()
+
+    def _scatter_iter(self, seed, percent, align, scale,
+                      rotate, offset, relativeOffset, mode, update):
+        self._rollbackState = None
+        if not self.sources or not all(self.backend.is_transform(source)
+                                       for source in self.sources):
+            return
+        transforms = self.compute_transforms(seed, percent, align, scale,
+                                             rotate, offset, relativeOffset)
+        keys = self._transformKeys
+        point_sources = self.assign_sources(seed)
+        total = len(transforms)
+        if mode == "auto":
+            if total > INSTANCER_THRESHOLD:
+                mode = "instancer"
+            else:
+                mode = "instances"
+        yield 0, total
+        self._rollbackState = (self.scatterNode, dict(self.scatterMap),
+                               self.scatterMode, self.scatterSources,
+                               self.scatterDest, self.scatterPoints,
+                               self._scatterNormals, self._displayNodes)
+        if not (update and self._can_update(mode)):
+            # The previous scatter keeps the display it was drawn with
+            self.scatterNode = None
+            self.scatterMap = {}
+            self._displayNodes = []
+        self.scatterMode = mode
+        self.scatterSources = list(self.sources)
+        self.scatterDest = self._dest_key()
+        self.scatterPoints = None
+        self._scatterNormals = (keys, self._transformNormals)
+        with self.backend.batch("scatter"), self._phase("write"):
+            if mode == "instancer":
+                self.scatterPoints = (keys, transforms, point_sources)
+                if self.scatterNode is None:
+                    self.scatterNode = self.backend.create_instancer(
+                        self.sources, "scatter_instancer")
+                self.backend.set_instancer_points(self.scatterNode,
+                                                  transforms, point_sources)
+                self._apply_display()
+                yield total, total
+                return
+            # This method is not constraining instances to parent
+            # vertices. What's missing vs things like Point on Poly?
+            if self.scatterNode is None:
+                self.scatterNode = self.backend.create_group("scatter_grp")
+            for done in iter_update_instances(self.backend, self.sources,
+                                              transforms, keys, point_sources,
+                                              self.scatterMap,
+                                              self.scatterNode):
+                if done == total:
+                    self._apply_display()
+                yield done, total
+
+    def export_points(self, path, seed, percent, align, scale,
+                      rotate, offset, relativeOffset):
+        """Write what a scatter with these settings would place to a
+        scatter_pointcache file at path instead of the scene
+
+        Every point is stored with its source, position, orientation, scale
+        and destination, streamed out a chunk at a time. No node is created,
+        so a huge scatter can be handed on without growing the saved scene.
+
+        Returns:
+            int: the number of points written
+        """
+        with self._recording("export"):
+            transforms = self.compute_transforms(
+                seed, percent, align, scale, rotate, offset, relativeOffset)
+            point_sources = self.assign_sources(seed)
+            with self._phase("write"):
+                with scatter_pointcache.PointCacheWriter(
+                        path, self.sources) as writer:
+                    writer.write(self._transformKeys, transforms,
+                                 point_sources)
+            self._count("points", len(transforms))
+            return len(transforms)
+
+    def import_points(self, path):
+        """Draw the points of a scatter_pointcache file through a new
+        instancer, which becomes the last scatter
+
+        The sources are looked up by the names stored in the file.
+
+        Returns:
+            str: the instancer
+        """
+        with self._recording("import"):
+            with self._phase("read"), \
+                    scatter_pointcache.PointCache(path) as point_cache:
+                sources = point_cache.sources
+                keys = point_cache.keys()
+                transforms = point_cache.transforms()
+                point_sources = point_cache.source_ids()
+            missing = [source for source in sources
+                       if not self.backend.exists(source)]
+            if missing:
+                raise ValueError("Sources of {0} are missing: {1}".format(
+                    path, ", ".join(missing)))
+            self._rollbackState = None
+            with self.backend.batch("import"), self._phase("write"):
+                self.scatterNode = self.backend.create_instancer(
+                    sources, "scatter_instancer")
+                self.backend.set_instancer_points(self.scatterNode,
+                                                  transforms, point_sources)
+                self.scatterMode = "instancer"
+                self.scatterSources = list(sources)
+                self.scatterDest = None
+                self._scatterNormals = None
+                self.scatterMap = {}
+                self.scatterPoints = (keys, transforms, point_sources)
+                self._displayNodes = []
+                self._apply_display()
+            self._count("points", len(keys))
+            return self.scatterNode
+
+    def rollback_scatter(self):
+        """Undo the scene writes of the last scatter and forget its result"""
+        if self._rollbackState is None:
+            return
+        self.backend.undo()
+        (self.scatterNode, self.scatterMap, self.scatterMode,
+         self.scatterSources, self.scatterDest, self.scatterPoints,
+         self._scatterNormals, self._displayNodes) = self._rollbackState
+        self._rollbackState = None
+
+    def _display_mode(self, count):
+        if self.displayMode != "auto":
+            return self.displayMode
+        if count > self.displayThreshold:
+            return "bbox"
+        return "full"
+
+    def _far_instances(self, nodes):
+        """Return the instances further than displayDistance from the
+        camera, both in world space"""
+        camera = self.backend.camera_position()
+        limit = self.displayDistance * self.displayDistance
+        far = []
+        for node, matrix in zip(nodes, self.backend.get_transforms(
+                nodes, world=True)):
+            distance = ((matrix[12] - camera[0]) ** 2 +
+                        (matrix[13] - camera[1]) ** 2 +
+                        (matrix[14] - camera[2]) ** 2)
+            if distance > limit:
+                far.append(node)
+        return far
+
+    def _apply_display(self):
+        """Draw the last scatter by the display settings, only switching
+        nodes whose display changes"""
+        if self.scatterMode == "instancer":
+            count = len(self.scatterPoints[1])
+        else:
+            count = len(self.scatterMap)
+        boxed = []
+        if self._display_mode(count) == "bbox":
+            boxed = [self.scatterNode]
+            if self.scatterMode == "instances" and self.displayDistance > 0:
+                boxed = self._far_instances(
+                    [node for node, _ in self.scatterMap.values()])
+        boxed_set = set(boxed)
+        previous = set(self._displayNodes)
+        unboxed = [node for node in self._displayNodes
+                   if node not in boxed_set and self.backend.exists(node)]
+        if unboxed:
+            self.backend.set_display(unboxed, "full")
+        newly_boxed = [node for node in boxed if node not in previous]
+        if newly_boxed:
+            self.backend.set_display(newly_boxed, "bbox")
+        self._count("boxed", len(boxed))
+        self._displayNodes = boxed
+
+    def set_display(self, mode=None):
+        """Redraw the last scatter with display mode, or displayMode
+
+        This is the per scatter toggle: mode is one of DISPLAY_MODES and
+        becomes displayMode. Above displayThreshold points "auto" draws
+        bounding boxes. With a displayDistance the boxes are only drawn for
+        instances further than that from the camera, an instancer is one
+        node and is boxed as a whole. Call again once the camera moved.
+        Only the viewport changes, renders get the real geometry.
+        """
+        if mode is not None:
+            self.displayMode = mode
+        if self.scatterNode is None or not self.backend.exists(
+                self.scatterNode):
+            return
+        with self._recording("display"):
+            with self.backend.batch("display"), self._phase("write"):
+                self._apply_display()
+
+    def _align_bases(self, keys):
+        """Return the align_basis of every key from the normal the last
+        scatter built it on, None for keys without one"""
+        normal_of = {}
+        if self._scatterNormals is not None:
+            scatter_keys, normals = self._scatterNormals
+            for i, key in enumerate(scatter_keys):
+                normal_of[key] = normals[i * 3:i * 3 + 3]
+        missing = sum(1 for key in keys if key not in normal_of)
+        if missing:
+            # Imported points carry no normals
+            log.warning("%d of %d points have no normal to align to, they "
+                        "are rotated about the world axes", missing,
+                        len(keys))
+        return [scatter_engine.align_basis(normal_of[key])
+                if key in normal_of else None for key in keys]
+
+    def rerandomize(self, seed, scale=None, rotate=None, align=False):
+        """Redraw only the scale or only the rotation of the selected
+        instances of the last scatter
+
+        Pass the new scale or rotate ranges, the values are drawn as a full
+        scatter with them would, so nothing else moves. Selecting the scatter
+        group or instancer redraws all of its points. New rotations are
+        aligned to the normal each point was scattered on when align is on,
+        also when that scatter came from the disk cache. The matrices are
+        read and written back with one backend call each, in one undo step.
+
+        Returns:
+            int: the number of instances changed
+        """
+        with self._recording("rerandomize"):
+            if self.scatterNode is None:
+                return 0
+            selection = set(self.backend.selection())
+            if self.scatterMode == "instancer":
+                if self.scatterNode not in selection or not self.scatterPoints:
+                    return 0
+                keys, transforms, point_sources = self.scatterPoints
+            else:
+                node_keys = [(node, key)
+                             for key, (node, _) in self.scatterMap.items()]
+                if self.scatterNode not in selection:
+                    node_keys = [(node, key) for node, key in node_keys
+                                 if node in selection]
+                if not node_keys:
+                    return 0
+                nodes = [node for node, _ in node_keys]
+                keys = [key for _, key in node_keys]
+                matrices = array.array('d')
+                for matrix in self.backend.get_transforms(nodes):
+                    matrices.extend(matrix)
+                transforms = scatter_engine.TransformBatch(matrices)
+            bases = None
+            if rotate is not None and align:
+                bases = self._align_bases(keys)
+            with self._phase("transform"):
+                transforms = scatter_engine.rerandomize_transforms(
+                    transforms, keys, seed, scale, rotate, bases)
+            with self.backend.batch("rerandomize"), self._phase("write"):
+                if self.scatterMode == "instancer":
+                    self.backend.set_instancer_points(
+                        self.scatterNode, transforms, point_sources)
+                    self.scatterPoints = (keys, transforms, point_sources)
+                else:
+                    self.backend.set_transforms(
+                        nodes, [transforms.matrix(i)
+                                for i in range(len(transforms))])
+            self._count("points", len(keys))
+            return len(keys)
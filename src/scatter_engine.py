@@ -0,0 +1,848 @@
+"""Scatter compute engine
+
+Everything in here is plain Python with no Maya imports, so it can be run and
+tested outside of a Maya session. Points and normals are passed around as flat
+sequences of floats, three per point. Matrices follow Maya's row vector
+convention: 16 floats, row major, translation in the last row, which is what
+cmds.xform(m=...) expects.
+"""
+import array
+import bisect
+import math
+import multiprocessing
+import numbers
+import sys
+import zlib
+
+UP_VECTOR = (0.0, 1.0, 0.0)
+# Used when a normal is parallel to UP_VECTOR and the cross product collapses
+FALLBACK_UP_VECTOR = (1.0, 0.0, 0.0)
+# Candidates drawn per wanted point before Poisson disk sampling gives up
+POISSON_OVERSAMPLE = 10
+
+_MASK64 = (1 << 64) - 1
+_GOLDEN = 0x9E3779B97F4A7C15
+# Counters of the per point random channels used by build_transforms and
+# choose_sources
+(SCALE_X, SCALE_Y, SCALE_Z, ROTATE_X, ROTATE_Y, ROTATE_Z, OFFSET_Y,
+ SOURCE) = range(8)
+
+
+def _cross(a, b):
+    return (a[1] * b[2] - a[2] * b[1],
+            a[2] * b[0] - a[0] * b[2],
+            a[0] * b[1] - a[1] * b[0])
+
+
+def _normalize(vec):
+    length = math.sqrt(vec[0] * vec[0] + vec[1] * vec[1] + vec[2] * vec[2])
+    if length < 1e-12:
+        return None
+    return (vec[0] / length, vec[1] / length, vec[2] / length)
+
+
+def align_basis(normal):
+    """Return the (tangent2, normal, tangent) rows that point local Y down
+    the normal"""
+    normal = _normalize(normal) or UP_VECTOR
+    tangent = _normalize(_cross(normal, UP_VECTOR))
+    if tangent is None:
+        tangent = _normalize(_cross(normal, FALLBACK_UP_VECTOR))
+    tangent2 = _normalize(_cross(normal, tangent))
+    return tangent2, normal, tangent
+
+
+def euler_to_rows(rx, ry, rz):
+    """Return the rotation rows of an xyz ordered euler rotation in degrees"""
+    rx, ry, rz = math.radians(rx), math.radians(ry), math.radians(rz)
+    sx, cx = math.sin(rx), math.cos(rx)
+    sy, cy = math.sin(ry), math.cos(ry)
+    sz, cz = math.sin(rz), math.cos(rz)
+    return ((cy * cz, cy * sz, -sy),
+            (sx * sy * cz - cx * sz, sx * sy * sz + cx * cz, sx * cy),
+            (cx * sy * cz + sx * sz, cx * sy * sz - sx * cz, cx * cy))
+
+
+def rows_to_euler(rows):
+    """Return the xyz ordered euler rotation in degrees of orthonormal rows"""
+    sy = max(-1.0, min(1.0, -rows[0][2]))
+    ry = math.asin(sy)
+    if abs(sy) < 1.0 - 1e-9:
+        rx = math.atan2(rows[1][2], rows[2][2])
+        rz = math.atan2(rows[0][1], rows[0][0])
+    else:
+        rx = math.atan2(-rows[2][1], rows[1][1])
+        rz = 0.0
+    return [math.degrees(rx), math.degrees(ry), math.degrees(rz)]
+
+
+def rows_to_quaternion(rows):
+    """Return the unit quaternion (x, y, z, w) of orthonormal rotation rows
+
+    Rows rotate row vectors, v * rows, so they are the transpose of the
+    usual column matrix the quaternion formulas are written for.
+    """
+    (m00, m10, m20), (m01, m11, m21), (m02, m12, m22) = rows
+    trace = m00 + m11 + m22
+    if trace > 0.0:
+        s = 0.5 / math.sqrt(trace + 1.0)
+        quaternion = ((m21 - m12) * s, (m02 - m20) * s, (m10 - m01) * s,
+                      0.25 / s)
+    elif m00 > m11 and m00 > m22:
+        s = 2.0 * math.sqrt(1.0 + m00 - m11 - m22)
+        quaternion = (0.25 * s, (m01 + m10) / s, (m02 + m20) / s,
+                      (m21 - m12) / s)
+    elif m11 > m22:
+        s = 2.0 * math.sqrt(1.0 + m11 - m00 - m22)
+        quaternion = ((m01 + m10) / s, 0.25 * s, (m12 + m21) / s,
+                      (m02 - m20) / s)
+    else:
+        s = 2.0 * math.sqrt(1.0 + m22 - m00 - m11)
+        quaternion = ((m02 + m20) / s, (m12 + m21) / s, 0.25 * s,
+                      (m10 - m01) / s)
+    return quaternion
+
+
+def quaternion_to_rows(quaternion):
+    """Return the rotation rows of a unit quaternion (x, y, z, w)"""
+    x, y, z, w = quaternion
+    return ((1.0 - 2.0 * (y * y + z * z), 2.0 * (x * y + z * w),
+             2.0 * (x * z - y * w)),
+            (2.0 * (x * y - z * w), 1.0 - 2.0 * (x * x + z * z),
+             2.0 * (y * z + x * w)),
+            (2.0 * (x * z + y * w), 2.0 * (y * z - x * w),
+             1.0 - 2.0 * (x * x + y * y)))
+
+
+def compose_matrix(position, rows, scale):
+    """Return the 16 float matrix placing rows scaled by scale at
+    position"""
+    matrix = []
+    for row, factor in zip(rows, scale):
+        matrix.extend((row[0] * factor, row[1] * factor, row[2] * factor,
+                       0.0))
+    matrix.extend((position[0], position[1], position[2], 1.0))
+    return matrix
+
+
+def _mix64(z):
+    """The splitmix64 finalizer, scrambling a 64 bit int into another"""
+    z = ((z ^ (z >> 30)) * 0xBF58476D1CE4E5B9) & _MASK64
+    z = ((z ^ (z >> 27)) * 0x94D049BB133111EB) & _MASK64
+    return z ^ (z >> 31)
+
+
+def stream_key(*parts):
+    """Hash ints, strings and tuples of them into a 64 bit stream key
+
+    Strings go through crc32 rather than hash() so keys are the same in every
+    process and Python version.
+    """
+    key = 0
+    for part in parts:
+        if isinstance(part, tuple):
+            part = stream_key(*part)
+        elif not isinstance(part, numbers.Integral):
+            part = zlib.crc32(str(part).encode("utf-8")) & 0xFFFFFFFF
+        key = _mix64(((key ^ (part & _MASK64)) + _GOLDEN) & _MASK64)
+    return key
+
+
+def uniform_at(key, counter):
+    """Return value number counter of stream key, a float in [0, 1)
+
+    Counter based: the value is a hash of the key and counter, so it does
+    not depend on what was drawn before it or in which order.
+    """
+    z = _mix64((key + (counter + 1) * _GOLDEN) & _MASK64)
+    return (z >> 11) * (1.0 / (1 << 53))
+
+
+class CounterRandom(object):
+    """A seeded stream of uniform_at values that stands in for random.Random
+
+    Draws the same values for the same key parts, e.g. (seed, mesh), no
+    matter what else has been drawn in the process, and never touches the
+    global random module.
+    """
+
+    def __init__(self, *key):
+        self.key = stream_key(*key)
+        self.counter = 0
+
+    def random(self):
+        value = uniform_at(self.key, self.counter)
+        self.counter += 1
+        return value
+
+    def uniform(self, low, high):
+        return low + (high - low) * self.random()
+
+
+def find_run(indices, position):
+    """Return the run of consecutive ids in sorted, unique indices that
+    starts at position, as (start id, end id, position after the run)
+
+    Inside a run indices[i] - i stays the same and it only grows at a gap,
+    so the end is found by bisection instead of walking the run.
+    """
+    key = indices[position] - position
+    low, high = position + 1, len(indices)
+    while low < high:
+        middle = (low + high) // 2
+        if indices[middle] - middle == key:
+            low = middle + 1
+        else:
+            high = middle
+    return indices[position], indices[low - 1], low
+
+
+class VertexSelection(object):
+    """Vertex ids per mesh, stored as integer arrays instead of names
+
+    Vertices are numbered across all meshes in mesh order, so a flat index in
+    range(len(selection)) maps to one (mesh, vertex id) pair.
+    """
+
+    def __init__(self):
+        self._meshes = []
+        self._indices = {}
+        self._offsets = []
+        self._count = 0
+
+    def add(self, mesh, indices):
+        """Add vertex ids of a mesh, merging with any already added"""
+        if mesh in self._indices:
+            indices = set(indices).union(self._indices[mesh])
+            self._count -= len(self._indices[mesh])
+        else:
+            self._meshes.append(mesh)
+        self._indices[mesh] = array.array('l', sorted(set(indices)))
+        self._count += len(self._indices[mesh])
+        self._offsets = []
+
+    def __len__(self):
+        return self._count
+
+    def __iter__(self):
+        for mesh in self._meshes:
+            for index in self._indices[mesh]:
+                yield mesh, index
+
+    def __getitem__(self, i):
+        if not self._offsets:
+            total = 0
+            for mesh in self._meshes:
+                self._offsets.append(total)
+                total += len(self._indices[mesh])
+        mesh_index = bisect.bisect_right(self._offsets, i) - 1
+        mesh = self._meshes[mesh_index]
+        return mesh, self._indices[mesh][i - self._offsets[mesh_index]]
+
+    def meshes(self):
+        return list(self._meshes)
+
+    def indices(self, mesh):
+        return self._indices[mesh]
+
+
+def sample_indices(count, k, seed):
+    """Pick k distinct indices from range(count) in O(k) time and memory
+
+    This is a Fisher-Yates shuffle that only remembers the slots it swapped,
+    stopped after k steps. The picks come from their own seeded stream, so the
+    first k picks are the same for any larger k: raising the percentage with
+    the same seed keeps the points already placed and adds to them.
+    Pick i is drawn from uniform_at(stream_key(seed), i).
+    """
+    k = min(k, count)
+    key = stream_key(seed)
+    swapped = {}
+    picks = []
+    for i in range(k):
+        j = i + int(uniform_at(key, i) * (count - i))
+        picks.append(swapped.get(j, j))
+        swapped[j] = swapped.get(i, i)
+    return picks
+
+
+def thin_vertices(mesh, indices, weights, density, seed):
+    """Return the vertex ids of indices kept with probability density times
+    their weight
+
+    Vertex i of mesh is kept when uniform_at(stream_key(seed, mesh,
+    "density"), i) is under density * weights[i], so a vertex only comes or
+    goes when its own weight or the density crosses that value. Painting
+    one area never moves the points of another.
+    """
+    key = stream_key(seed, mesh, "density")
+    return array.array('l', [i for i in indices
+                             if uniform_at(key, i) < density * weights[i]])
+
+
+def allocate_counts(weights, total):
+    """Split total into whole numbers proportional to weights
+
+    Uses largest remainders so the counts always add up to total.
+    """
+    weight_sum = float(sum(weights))
+    if not weight_sum:
+        return [0] * len(weights)
+    exact = [total * weight / weight_sum for weight in weights]
+    counts = [int(value) for value in exact]
+    by_remainder = sorted(range(len(weights)),
+                          key=lambda i: exact[i] - counts[i], reverse=True)
+    for i in by_remainder[:total - sum(counts)]:
+        counts[i] += 1
+    return counts
+
+
+class AliasTable(object):
+    """Draw indices with probability proportional to weights in O(1)
+
+    Vose's alias method: building is O(n), every draw costs one random number
+    and a lookup, however many weights there are.
+    """
+
+    def __init__(self, weights):
+        count = len(weights)
+        weight_sum = float(sum(weights))
+        self.probability = array.array('d', [1.0]) * count
+        self.alias = array.array('l', range(count))
+        scaled = [weight * count / weight_sum for weight in weights]
+        small = [i for i, value in enumerate(scaled) if value < 1.0]
+        large = [i for i, value in enumerate(scaled) if value >= 1.0]
+        while small and large:
+            less = small.pop()
+            more = large.pop()
+            self.probability[less] = scaled[less]
+            self.alias[less] = more
+            scaled[more] = scaled[more] + scaled[less] - 1.0
+            if scaled[more] < 1.0:
+                small.append(more)
+            else:
+                large.append(more)
+
+    def __len__(self):
+        return len(self.probability)
+
+    def draw(self, rng):
+        value = rng.random() * len(self.probability)
+        i = int(value)
+        if value - i < self.probability[i]:
+            return i
+        return self.alias[i]
+
+
+def triangle_areas(positions, triangles):
+    """Return the area of every triangle, three vertex ids per triangle"""
+    areas = array.array('d')
+    p = positions
+    for t in range(0, len(triangles), 3):
+        a, b, c = triangles[t] * 3, triangles[t + 1] * 3, triangles[t + 2] * 3
+        edge1 = (p[b] - p[a], p[b + 1] - p[a + 1], p[b + 2] - p[a + 2])
+        edge2 = (p[c] - p[a], p[c + 1] - p[a + 1], p[c + 2] - p[a + 2])
+        cross = _cross(edge1, edge2)
+        areas.append(0.5 * math.sqrt(cross[0] * cross[0] + cross[1] *
+                                     cross[1] + cross[2] * cross[2]))
+    return areas
+
+
+def _surface_point(positions, triangles, t, rng):
+    """Return a uniform random point on triangle t and its corner weights"""
+    r1 = math.sqrt(rng.random())
+    r2 = rng.random()
+    wa, wb, wc = 1.0 - r1, r1 * (1.0 - r2), r1 * r2
+    a, b, c = triangles[t * 3] * 3, triangles[t * 3 + 1] * 3, \
+        triangles[t * 3 + 2] * 3
+    p = positions
+    point = (p[a] * wa + p[b] * wb + p[c] * wc,
+             p[a + 1] * wa + p[b + 1] * wb + p[c + 1] * wc,
+             p[a + 2] * wa + p[b + 2] * wb + p[c + 2] * wc)
+    return point, (a, b, c, wa, wb, wc)
+
+
+def _surface_normal(normals, corners):
+    """Interpolate the vertex normals at the corner weights of a point"""
+    a, b, c, wa, wb, wc = corners
+    n = normals
+    normal = (n[a] * wa + n[b] * wb + n[c] * wc,
+              n[a + 1] * wa + n[b + 1] * wb + n[c + 1] * wc,
+              n[a + 2] * wa + n[b + 2] * wb + n[c + 2] * wc)
+    return _normalize(normal) or UP_VECTOR
+
+
+def sample_surface(positions, normals, triangles, count, rng=None,
+                   areas=None, table=None):
+    """Scatter count points uniformly by area over the triangles
+
+    Args:
+        positions: flat vertex positions, three floats per vertex
+        normals: flat vertex normals, three floats per vertex
+        triangles: flat vertex ids, three per triangle
+        count: number of points
+        rng: anything with a random() method, CounterRandom(0) by default
+        areas: triangle_areas(positions, triangles), if already computed
+        table: AliasTable(areas), if already built
+
+    Returns:
+        tuple: flat point positions and normals
+    """
+    if rng is None:
+        rng = CounterRandom(0)
+    if areas is None:
+        areas = triangle_areas(positions, triangles)
+    points = array.array('d')
+    point_normals = array.array('d')
+    if not count or not sum(areas):
+        return points, point_normals
+    if table is None:
+        table = AliasTable(areas)
+    for _ in range(count):
+        point, corners = _surface_point(positions, triangles,
+                                        table.draw(rng), rng)
+        points.extend(point)
+        point_normals.extend(_surface_normal(normals, corners))
+    return points, point_normals
+
+
+_NEIGHBOUR_CELLS = sorted(
+    ((x, y, z) for x in (-1, 0, 1) for y in (-1, 0, 1) for z in (-1, 0, 1)),
+    key=lambda cell: abs(cell[0]) + abs(cell[1]) + abs(cell[2]))
+
+
+class HashGrid(object):
+    """A uniform spatial hash of points for radius queries
+
+    Points are bucketed by cell, so finding everything within cell_size of a
+    point only visits the 27 surrounding cells.
+    """
+
+    def __init__(self, cell_size):
+        self.cell_size = float(cell_size)
+        self.cells = {}
+        self.points = []
+
+    def _cell(self, point):
+        size = self.cell_size
+        return (int(math.floor(point[0] / size)),
+                int(math.floor(point[1] / size)),
+                int(math.floor(point[2] / size)))
+
+    def insert(self, point, radius=0.0):
+        """Add a point and return its index"""
+        index = len(self.points)
+        self.points.append((point[0], point[1], point[2], radius))
+        self.cells.setdefault(self._cell(point), []).append(index)
+        return index
+
+    def neighbours(self, point):
+        """Return the indices of every point in the cells around point"""
+        cx, cy, cz = self._cell(point)
+        cells = self.cells
+        found = []
+        for dx, dy, dz in _NEIGHBOUR_CELLS:
+            cell = cells.get((cx + dx, cy + dy, cz + dz))
+            if cell:
+                found.extend(cell)
+        return found
+
+    def collides(self, point, radius=0.0, spacing=0.0):
+        """Return True if a stored point is closer than the radii plus
+        spacing"""
+        px, py, pz = point[0], point[1], point[2]
+        cx, cy, cz = self._cell(point)
+        cells = self.cells
+        points = self.points
+        # The centre cell comes first, it is where most collisions are
+        for dx, dy, dz in _NEIGHBOUR_CELLS:
+            cell = cells.get((cx + dx, cy + dy, cz + dz))
+            if not cell:
+                continue
+            for index in cell:
+                ox, oy, oz, other_radius = points[index]
+                limit = radius + other_radius + spacing
+                ox -= px
+                oy -= py
+                oz -= pz
+                if ox * ox + oy * oy + oz * oz < limit * limit:
+                    return True
+        return False
+
+
+def sample_poisson(positions, normals, triangles, spacing, count,
+                   rng=None, candidates=None, areas=None, table=None):
+    """Scatter up to count points by area, no two closer than spacing
+
+    Dart throwing: candidates are drawn uniformly by area and accepted only
+    when a HashGrid finds nothing within spacing, which gives a blue noise
+    distribution without the clumps of plain random sampling. Stops at count
+    points or once the candidates run out.
+
+    Returns:
+        tuple: flat point positions and normals
+    """
+    if rng is None:
+        rng = CounterRandom(0)
+    if candidates is None:
+        candidates = count * POISSON_OVERSAMPLE
+    if spacing <= 0.0:
+        return sample_surface(positions, normals, triangles, count, rng,
+                              areas, table)
+    if areas is None:
+        areas = triangle_areas(positions, triangles)
+    points = array.array('d')
+    point_normals = array.array('d')
+    if not count or not sum(areas):
+        return points, point_normals
+    if table is None:
+        table = AliasTable(areas)
+    grid = HashGrid(spacing)
+    accepted = 0
+    for _ in range(candidates):
+        point, corners = _surface_point(positions, triangles,
+                                        table.draw(rng), rng)
+        if grid.collides(point, spacing=spacing):
+            continue
+        grid.insert(point)
+        points.extend(point)
+        point_normals.extend(_surface_normal(normals, corners))
+        accepted += 1
+        if accepted == count:
+            break
+    return points, point_normals
+
+
+def channel_values(point_keys, channel, low, high):
+    """Return the value of one random channel for every point
+
+    Args:
+        point_keys: stream_key(seed, point id) of every point
+        channel: the counter of the channel, e.g. SCALE_X
+        low: the smallest value
+        high: the largest value
+    """
+    size = high - low
+    return [low + size * uniform_at(key, channel) for key in point_keys]
+
+
+def choose_sources(keys, weights, seed):
+    """Return the index of the source picked for every point key
+
+    Source i is picked with probability weights[i] / sum(weights), from the
+    SOURCE channel of the point's own stream. A point keeps its source when
+    others come and go, and changing a weight only moves the points whose
+    value falls between the old and new bounds.
+    """
+    if len(weights) <= 1 or not sum(weights):
+        return array.array('l', [0]) * len(keys)
+    total = float(sum(weights))
+    bounds = []
+    running = 0.0
+    for weight in weights:
+        running += weight
+        bounds.append(running / total)
+    # Rounding can leave the last bound under 1.0, close the gap on the last
+    # source that can be picked
+    last = max(i for i, weight in enumerate(weights) if weight > 0)
+    for i in range(last, len(bounds)):
+        bounds[i] = 1.0
+    return array.array('l', [
+        bisect.bisect_right(bounds, uniform_at(stream_key(seed, key), SOURCE))
+        for key in keys])
+
+
+class TransformBatch(object):
+    """The transforms of a batch of instances as one flat array of matrices"""
+
+    def __init__(self, matrices=None):
+        self.matrices = matrices if matrices is not None else array.array('d')
+
+    def __len__(self):
+        return len(self.matrices) // 16
+
+    def matrix(self, i):
+        return list(self.matrices[i * 16:i * 16 + 16])
+
+    def translation(self, i):
+        return list(self.matrices[i * 16 + 12:i * 16 + 15])
+
+    def _rows(self, i):
+        m = self.matrices
+        return [m[i * 16 + row * 4:i * 16 + row * 4 + 3] for row in range(3)]
+
+    def scale(self, i):
+        return [math.sqrt(r[0] * r[0] + r[1] * r[1] + r[2] * r[2])
+                for r in self._rows(i)]
+
+    def _rotation_rows(self, i, scale=None):
+        rows = []
+        for row, length in zip(self._rows(i), scale or self.scale(i)):
+            length = length or 1.0
+            rows.append((row[0] / length, row[1] / length, row[2] / length))
+        return rows
+
+    def rotation(self, i):
+        """Return the xyz euler rotation in degrees with the scale removed"""
+        return rows_to_euler(self._rotation_rows(i))
+
+    def orientation(self, i):
+        """Return the rotation as a unit quaternion (x, y, z, w)"""
+        return rows_to_quaternion(self._rotation_rows(i))
+
+    def decompose(self, i):
+        """Return the translation, orientation quaternion and scale"""
+        scale = self.scale(i)
+        return (self.translation(i),
+                rows_to_quaternion(self._rotation_rows(i, scale)), scale)
+
+    def subset(self, indices):
+        """Return a new batch with only the transforms at indices"""
+        matrices = array.array('d')
+        for i in indices:
+            matrices.extend(self.matrices[i * 16:i * 16 + 16])
+        return TransformBatch(matrices)
+
+
+def gather_vectors(values, indices):
+    """Return the flat 3 float vectors of values at indices"""
+    gathered = array.array('d')
+    for i in indices:
+        gathered.extend(values[i * 3:i * 3 + 3])
+    return gathered
+
+
+def build_transforms(positions, normals, scale, rotate, offset,
+                     align=False, relative_offset=False, seed=0, keys=None):
+    """Build the scatter transform of every point in one pass
+
+    Args:
+        positions: flat world space positions, three floats per point
+        normals: flat world space normals, three floats per point
+        scale: [x min, x max, y min, y max, z min, z max]
+        rotate: [x min, x max, y min, y max, z min, z max] in degrees
+        offset: [min, max] distance to move along Y
+        align: point the local Y axis of each instance down its normal
+        relative_offset: offset along the instance Y axis instead of world Y
+        seed: the random seed
+        keys: a hashable id per point, e.g. (mesh, vertex id), defaults to
+            the point index. Every point draws its random values from its
+            own (seed, key) stream, so a point gets the same values whatever
+            else is in the batch and in whichever order batches are built.
+
+    Returns:
+        TransformBatch: scale, rotation, alignment and offset folded into a
+            single matrix per point
+    """
+    count = len(positions) // 3
+    if keys is None:
+        keys = range(count)
+    point_keys = [stream_key(seed, key) for key in keys]
+    scale_x = channel_values(point_keys, SCALE_X, scale[0], scale[1])
+    scale_y = channel_values(point_keys, SCALE_Y, scale[2], scale[3])
+    scale_z = channel_values(point_keys, SCALE_Z, scale[4], scale[5])
+    rotate_x = channel_values(point_keys, ROTATE_X, rotate[0], rotate[1])
+    rotate_y = channel_values(point_keys, ROTATE_Y, rotate[2], rotate[3])
+    rotate_z = channel_values(point_keys, ROTATE_Z, rotate[4], rotate[5])
+    offset_y = channel_values(point_keys, OFFSET_Y, offset[0], offset[1])
+    matrices = array.array('d', [0.0]) * (count * 16)
+    for i in range(count):
+        rows = euler_to_rows(rotate_x[i], rotate_y[i], rotate_z[i])
+        if align:
+            basis = align_basis(normals[i * 3:i * 3 + 3])
+            rows = [tuple(row[0] * basis[0][k] + row[1] * basis[1][k] +
+                          row[2] * basis[2][k] for k in range(3))
+                    for row in rows]
+        up = rows[1] if relative_offset else UP_VECTOR
+        base = i * 16
+        for row_index, factor in enumerate((scale_x[i], scale_y[i],
+                                            scale_z[i])):
+            row = rows[row_index]
+            matrices[base + row_index * 4] = row[0] * factor
+            matrices[base + row_index * 4 + 1] = row[1] * factor
+            matrices[base + row_index * 4 + 2] = row[2] * factor
+        for k in range(3):
+            matrices[base + 12 + k] = positions[i * 3 + k] + up[k] * offset_y[i]
+        matrices[base + 15] = 1.0
+    return TransformBatch(matrices)
+
+
+def rerandomize_transforms(transforms, keys, seed, scale=None, rotate=None,
+                           bases=None):
+    """Return a copy of transforms with only their scale or rotation redrawn
+
+    The new values come from the same (seed, key) streams and channels as
+    build_transforms, so they match a full scatter with these ranges.
+    Translations are kept, and so is whichever of the scale and orientation
+    is not redrawn.
+
+    Args:
+        transforms: the TransformBatch to start from
+        keys: the point key of every transform
+        seed: the random seed
+        scale: new scale ranges, or None to keep the scales
+        rotate: new rotate ranges, or None to keep the orientations
+        bases: the align_basis rows a new rotation is applied in, per point,
+            None for world axes
+    """
+    point_keys = [stream_key(seed, key) for key in keys]
+    if scale is not None:
+        scales = list(zip(
+            channel_values(point_keys, SCALE_X, scale[0], scale[1]),
+            channel_values(point_keys, SCALE_Y, scale[2], scale[3]),
+            channel_values(point_keys, SCALE_Z, scale[4], scale[5])))
+    if rotate is not None:
+        rotations = list(zip(
+            channel_values(point_keys, ROTATE_X, rotate[0], rotate[1]),
+            channel_values(point_keys, ROTATE_Y, rotate[2], rotate[3]),
+            channel_values(point_keys, ROTATE_Z, rotate[4], rotate[5])))
+    matrices = array.array('d', transforms.matrices)
+    for i in range(len(transforms)):
+        base = i * 16
+        old_rows = [matrices[base + r * 4:base + r * 4 + 3] for r in range(3)]
+        lengths = [math.sqrt(row[0] * row[0] + row[1] * row[1] +
+                             row[2] * row[2]) for row in old_rows]
+        if rotate is not None:
+            rows = euler_to_rows(*rotations[i])
+            basis = bases[i] if bases is not None else None
+            if basis is not None:
+                rows = [tuple(row[0] * basis[0][k] + row[1] * basis[1][k] +
+                              row[2] * basis[2][k] for k in range(3))
+                        for row in rows]
+        else:
+            rows = [[value / (length or 1.0) for value in row]
+                    for row, length in zip(old_rows, lengths)]
+        factors = scales[i] if scale is not None else lengths
+        for r in range(3):
+            for k in range(3):
+                matrices[base + r * 4 + k] = rows[r][k] * factors[r]
+    return TransformBatch(matrices)
+
+
+def reject_overlaps(transforms, radius):
+    """Return the indices of the transforms that do not overlap
+
+    Every instance is treated as a sphere of radius times its largest scale.
+    Transforms are kept in order, each only if its sphere is clear of all
+    the ones kept before it. A HashGrid with cells as wide as the largest
+    sphere keeps every check local instead of pairwise.
+    """
+    count = len(transforms)
+    if radius <= 0.0 or not count:
+        return list(range(count))
+    radii = [radius * max(transforms.scale(i)) for i in range(count)]
+    grid = HashGrid(max(2.0 * max(radii), 1e-6))
+    kept = []
+    for i in range(count):
+        point = transforms.translation(i)
+        if grid.collides(point, radii[i]):
+            continue
+        grid.insert(point, radii[i])
+        kept.append(i)
+    return kept
+
+
+def start_pool(workers, allow_fork=True):
+    """Return a multiprocessing pool of workers started fresh by spawn,
+    where Python has it
+
+    Forking copies the whole parent, its threads and GUI included. Without
+    spawn, on POSIX Python 2, the pool is only forked with allow_fork and
+    None is returned otherwise.
+    """
+    if hasattr(multiprocessing, "get_context"):
+        return multiprocessing.get_context("spawn").Pool(workers)
+    if sys.platform == "win32" or allow_fork:
+        # Windows has nothing but spawn
+        return multiprocessing.Pool(workers)
+    return None
+
+
+def map_parallel(func, jobs, workers=1, pool=None):
+    """Map func over jobs, in a pool of worker processes when workers > 1
+
+    func has to be a module level function and jobs plain picklable data.
+    Results come back in job order whatever order the workers finish in, so
+    merging them is deterministic. A multiprocessing pool passed in is used
+    and left running, otherwise one is started for this call only.
+    """
+    if workers <= 1 or len(jobs) <= 1:
+        return [func(job) for job in jobs]
+    if pool is not None:
+        return pool.map(func, jobs)
+    pool = start_pool(min(workers, len(jobs)))
+    try:
+        return pool.map(func, jobs)
+    finally:
+        pool.close()
+        pool.join()
+
+
+def sampling_table(job):
+    """map_parallel job: (positions, triangles) -> the triangle areas and
+    their AliasTable, None when the triangles have no area"""
+    positions, triangles = job
+    areas = triangle_areas(positions, triangles)
+    return areas, AliasTable(areas) if sum(areas) else None
+
+
+def weighted_sampling_table(job):
+    """map_parallel job: (areas, triangles, weights) -> the triangle areas
+    scaled by the mean weight of their corners, and their AliasTable, None
+    when nothing is left"""
+    areas, triangles, weights = job
+    weighted = array.array('d', [
+        areas[t] * (weights[triangles[t * 3]] + weights[triangles[t * 3 + 1]] +
+                    weights[triangles[t * 3 + 2]]) / 3.0
+        for t in range(len(areas))])
+    return weighted, AliasTable(weighted) if sum(weighted) else None
+
+
+def sample_mesh(job):
+    """map_parallel job sampling the surface of one destination mesh
+
+    Args:
+        job: (mesh, positions, normals, triangles, areas, table, count,
+            distribution, spacing, seed) with distribution "area" or
+            "poisson" and areas and table from sampling_table
+
+    Returns:
+        tuple: (mesh, sample id) keys, flat positions and flat normals
+    """
+    (mesh, positions, normals, triangles, areas, table, count, distribution,
+     spacing, seed) = job
+    rng = CounterRandom(seed, mesh)
+    if distribution == "poisson":
+        points, point_normals = sample_poisson(
+            positions, normals, triangles, spacing, count, rng, areas=areas,
+            table=table)
+    else:
+        points, point_normals = sample_surface(
+            positions, normals, triangles, count, rng, areas=areas,
+            table=table)
+    keys = [(mesh, i) for i in range(len(points) // 3)]
+    return keys, points, point_normals
+
+
+def transform_mesh(job):
+    """map_parallel job building and filtering the transforms of one mesh
+
+    Args:
+        job: (keys, positions, normals, scale, rotate, offset, align,
+            relative_offset, seed, radius), radius 0 keeps overlaps
+
+    Returns:
+        tuple: the keys that were kept, their flat matrices and their flat
+            normals
+    """
+    (keys, positions, normals, scale, rotate, offset, align,
+     relative_offset, seed, radius) = job
+    transforms = build_transforms(positions, normals, scale, rotate, offset,
+                                  align, relative_offset, seed, keys)
+    normals = array.array('d', normals)
+    if radius > 0.0:
+        kept = reject_overlaps(transforms, radius)
+        transforms = transforms.subset(kept)
+        keys = [keys[i] for i in kept]
+        normals = gather_vectors(normals, kept)
+    return keys, transforms.matrices, normals
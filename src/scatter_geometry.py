@@ -0,0 +1,147 @@
+"""In memory cache of destination mesh geometry
+
+A scatter reads the positions, normals and triangles of every destination
+mesh and derives more from them: the triangles inside the vertex selection,
+the area sampling tables and the hash keying the disk cache. Artists rerun
+the same destination over and over while tuning the settings, so
+GeometryCache keeps all of it between runs.
+
+An entry lives until the backend reports a change to its mesh, through
+SceneBackend.watch_mesh, or until it is the least recently used one once the
+cache is over its memory budget. Like scatter_engine this has no Maya
+imports.
+"""
+import array
+import collections
+import itertools
+import logging
+import sys
+
+log = logging.getLogger(__name__)
+
+# Least recently used meshes are dropped once the cache holds more than this
+MAX_GEOMETRY_SIZE = 512 * 1024 ** 2
+
+_versions = itertools.count(1)
+
+
+def size_of(value):
+    """Return roughly how many bytes value holds, arrays by their buffer"""
+    if isinstance(value, array.array):
+        return value.buffer_info()[1] * value.itemsize
+    if isinstance(value, (list, tuple)):
+        return sys.getsizeof(value) + sum(size_of(item) for item in value)
+    if hasattr(value, "__dict__"):
+        return sum(size_of(item) for item in vars(value).values())
+    return sys.getsizeof(value)
+
+
+class MeshGeometry(object):
+    """What a scatter reads from one mesh and what it derives from that
+
+    derived maps a key, like ("areas", selection key), to any value built
+    from the arrays. version is unique to every read of a mesh, so results
+    keyed on it go stale together with the geometry.
+    """
+
+    def __init__(self, positions, normals, triangles):
+        self.positions = positions
+        self.normals = normals
+        self.triangles = triangles
+        self.derived = {}
+        self.version = next(_versions)
+        self.nbytes = (size_of(positions) + size_of(normals) +
+                       size_of(triangles))
+
+    def vertex_count(self):
+        return len(self.positions) // 3
+
+
+class GeometryCache(object):
+    """A memory capped, least recently used map of mesh name to
+    MeshGeometry
+
+    Every cached mesh is watched through the backend and dropped on its
+    first change. The watch itself is only removed on the next call into
+    the cache, scene callbacks should not unregister themselves.
+    """
+
+    def __init__(self, backend, max_size=MAX_GEOMETRY_SIZE):
+        self.backend = backend
+        self.max_size = max_size
+        self.size = 0
+        self._entries = collections.OrderedDict()
+        self._watches = {}
+        self._stale = []
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, mesh):
+        return mesh in self._entries
+
+    def get(self, mesh):
+        """Return the cached MeshGeometry of mesh, or None"""
+        self._unwatch_stale()
+        geometry = self._entries.get(mesh)
+        if geometry is not None:
+            self._entries[mesh] = self._entries.pop(mesh)
+        return geometry
+
+    def put(self, mesh, geometry):
+        """Cache geometry for mesh and drop what goes over max_size"""
+        self._unwatch_stale()
+        self._drop(mesh)
+        self._entries[mesh] = geometry
+        self.size += geometry.nbytes
+        self._watches[mesh] = self.backend.watch_mesh(mesh, self.invalidate)
+        self._evict()
+        return geometry
+
+    def add_derived(self, mesh, key, value):
+        """Keep value as geometry.derived[key] and count it against
+        max_size, value is only returned once mesh is no longer cached"""
+        geometry = self._entries.pop(mesh, None)
+        if geometry is None:
+            return value
+        self._entries[mesh] = geometry
+        if key in geometry.derived:
+            geometry.nbytes -= size_of(geometry.derived[key])
+            self.size -= size_of(geometry.derived[key])
+        geometry.derived[key] = value
+        geometry.nbytes += size_of(value)
+        self.size += size_of(value)
+        self._evict()
+        return value
+
+    def invalidate(self, mesh):
+        """Forget mesh, called by the backend when it changes"""
+        if mesh in self._entries:
+            log.debug("Geometry of %s changed, dropping it", mesh)
+        self._drop(mesh)
+
+    def clear(self):
+        """Forget every mesh and remove all the watches"""
+        for mesh in list(self._entries):
+            self._drop(mesh)
+        self._unwatch_stale()
+
+    def _drop(self, mesh):
+        geometry = self._entries.pop(mesh, None)
+        if geometry is not None:
+            self.size -= geometry.nbytes
+        if mesh in self._watches:
+            self._stale.append(self._watches.pop(mesh))
+
+    def _unwatch_stale(self):
+        while self._stale:
+            self.backend.unwatch(self._stale.pop())
+
+    def _evict(self):
+        # The newest entry stays even on its own over the budget, it is the
+        # one being scattered on
+        while self.size > self.max_size and len(self._entries) > 1:
+            mesh = next(iter(self._entries))
+            log.debug("Geometry cache over budget, dropping %s", mesh)
+            self._drop(mesh)
+        self._unwatch_stale()
@@ -0,0 +1,441 @@
+"""Maya scene access for the scatter core"""
+import array
+import contextlib
+import math
+import multiprocessing
+import os
+import sys
+
+import maya.api.OpenMaya as om
+import maya.cmds
+
+import scatter_backend
+import scatter_engine
+import scatter_plugin
+
+# Mesh shape attributes whose dirtying means its points or normals changed
+_GEOMETRY_PLUGS = frozenset(["inMesh", "outMesh", "worldMesh", "pnts",
+                             "pntx", "pnty", "pntz"])
+# Transform attributes set_transform_matrices writes, in MTransformationMatrix
+# order
+_TRANSFORM_PLUGS = ("translateX", "translateY", "translateZ",
+                    "rotateX", "rotateY", "rotateZ",
+                    "scaleX", "scaleY", "scaleZ",
+                    "shearXY", "shearXZ", "shearYZ")
+_PLUGIN_PATH = os.path.splitext(scatter_plugin.__file__)[0] + ".py"
+# Modifiers waiting for the scatterModifier command to pick them up
+_pending_modifiers = []
+
+
+class _CountedCommands(object):
+    """Runs maya.cmds commands, counting every one for the stats"""
+
+    def __init__(self, module):
+        self._module = module
+        self.count = 0
+
+    def __getattr__(self, name):
+        command = getattr(self._module, name)
+
+        def run(*args, **kwargs):
+            self.count += 1
+            return command(*args, **kwargs)
+        return run
+
+
+cmds = _CountedCommands(maya.cmds)
+
+
+def _set_worker_executable():
+    """Point spawned workers at mayapy, inside Maya sys.executable is the
+    Maya binary itself and every worker would open a new Maya"""
+    maya_location = os.environ.get("MAYA_LOCATION")
+    if not maya_location:
+        return
+    mayapy = os.path.join(maya_location, "bin", "mayapy")
+    if sys.platform == "win32":
+        mayapy += ".exe"
+    if os.path.exists(mayapy):
+        multiprocessing.set_executable(mayapy)
+
+
+def get_vertex_selection(components):
+    """Return a VertexSelection of vertex components without flattening them
+
+    The ids are read straight off each component through the API, so
+    "pPlane1.vtx[0:99999]" never turns into 100000 strings.
+    """
+    selection = scatter_engine.VertexSelection()
+    sel_list = om.MSelectionList()
+    for component in components:
+        sel_list.add(component)
+    for i in range(sel_list.length()):
+        dag_path, component = sel_list.getComponent(i)
+        transform_path = om.MDagPath(dag_path)
+        if transform_path.apiType() == om.MFn.kMesh:
+            transform_path.pop()
+        mesh = transform_path.partialPathName()
+        if component.isNull():
+            indices = range(om.MFnMesh(dag_path).numVertices)
+        else:
+            indices = om.MFnSingleIndexedComponent(component).getElements()
+        selection.add(mesh, indices)
+    return selection
+
+
+def _get_shape_path(mesh):
+    sel_list = om.MSelectionList()
+    sel_list.add(mesh)
+    dag_path = sel_list.getDagPath(0)
+    if dag_path.hasFn(om.MFn.kTransform):
+        dag_path.extendToShape()
+    return dag_path
+
+
+def _get_fn_mesh(mesh):
+    return om.MFnMesh(_get_shape_path(mesh))
+
+
+def get_mesh_arrays(mesh):
+    """Return the world space positions and normals of every vertex on a mesh
+
+    Both are queried in one call each through the API and returned as flat
+    arrays of doubles, three per vertex, so vertex i lives at [i * 3:i * 3 + 3].
+    """
+    fn_mesh = _get_fn_mesh(mesh)
+    positions = array.array('d')
+    for point in fn_mesh.getPoints(om.MSpace.kWorld):
+        positions.extend((point.x, point.y, point.z))
+    normals = array.array('d')
+    for normal in fn_mesh.getVertexNormals(False, om.MSpace.kWorld):
+        normals.extend((normal.x, normal.y, normal.z))
+    return positions, normals
+
+
+def get_mesh_triangles(mesh):
+    """Return the vertex ids of the mesh triangulation, three per triangle"""
+    _, triangle_vertices = _get_fn_mesh(mesh).getTriangles()
+    return array.array('l', triangle_vertices)
+
+
+def _vertex_uvs(fn_mesh):
+    """Return flat u and v lists with the UV of every vertex, from the
+    first face using it, and whether each vertex has one"""
+    count = fn_mesh.numVertices
+    u_values = [0.0] * count
+    v_values = [0.0] * count
+    has_uv = [False] * count
+    us, vs = fn_mesh.getUVs()
+    vertex_counts, vertex_ids = fn_mesh.getVertices()
+    uv_counts, uv_ids = fn_mesh.getAssignedUVs()
+    vertex_at = uv_at = 0
+    for vertex_count, uv_count in zip(vertex_counts, uv_counts):
+        # Faces without UVs assign none and are skipped
+        if uv_count == vertex_count:
+            for k in range(vertex_count):
+                vertex = vertex_ids[vertex_at + k]
+                if not has_uv[vertex]:
+                    u_values[vertex] = us[uv_ids[uv_at + k]]
+                    v_values[vertex] = vs[uv_ids[uv_at + k]]
+                    has_uv[vertex] = True
+        vertex_at += vertex_count
+        uv_at += uv_count
+    return u_values, v_values, has_uv
+
+
+def get_vertex_weights(mesh, density_map):
+    """Return the mean of the red, green and blue of density_map at every
+    vertex of mesh
+
+    density_map is a 2D texture node, sampled at the vertex UVs in a single
+    colorAtPoint call, or else the name of a color set of mesh, read in one
+    API call. Vertices without a color or UV weigh 0.
+    """
+    fn_mesh = _get_fn_mesh(mesh)
+    weights = array.array('d')
+    if (cmds.objExists(density_map) and cmds.getClassification(
+            cmds.nodeType(density_map), satisfies="texture/2d")):
+        u_values, v_values, has_uv = _vertex_uvs(fn_mesh)
+        colors = cmds.colorAtPoint(density_map, output="RGB", u=u_values,
+                                   v=v_values)
+        for i in range(fn_mesh.numVertices):
+            weights.append(sum(colors[i * 3:i * 3 + 3]) / 3.0
+                           if has_uv[i] else 0.0)
+        return weights
+    if density_map not in fn_mesh.getColorSetNames():
+        raise ValueError("{0} is neither a 2D texture nor a color set of "
+                         "{1}".format(density_map, mesh))
+    for color in fn_mesh.getVertexColors(density_map, om.MColor((0, 0, 0))):
+        weights.append((color.r + color.g + color.b) / 3.0)
+    return weights
+
+
+def get_bounding_radius(source):
+    """Return the radius around its pivot that holds source's geometry"""
+    bbox = cmds.xform(source, q=True, boundingBox=True, objectSpace=True)
+    return max(math.sqrt(x * x + y * y + z * z)
+               for x in (bbox[0], bbox[3])
+               for y in (bbox[1], bbox[4])
+               for z in (bbox[2], bbox[5]))
+
+
+def watch_mesh(mesh, callback):
+    """Call callback(mesh) when the shape of mesh is deformed or edited, it
+    moves in world space or is deleted
+
+    Returns:
+        list: the callback ids, for om.MMessage.removeCallbacks
+    """
+    dag_path = _get_shape_path(mesh)
+    shape = dag_path.node()
+
+    def dirty_plug(node, plug, client_data):
+        if om.MFnAttribute(plug.attribute()).name in _GEOMETRY_PLUGS:
+            callback(mesh)
+
+    def moved(node, modified, client_data):
+        callback(mesh)
+
+    def removed(node, client_data):
+        callback(mesh)
+
+    return [om.MNodeMessage.addNodeDirtyPlugCallback(shape, dirty_plug),
+            om.MDagMessage.addWorldMatrixModifiedCallback(dag_path, moved),
+            om.MNodeMessage.addNodePreRemovalCallback(shape, removed)]
+
+
+def set_instancer_points(instancer, transforms, object_indices=None):
+    """Write the transforms as per point arrays on an instancer's inputPoints
+
+    object_indices picks the instanced object of every point, by its index
+    in the instancer's object list. The data is set in one undoable
+    scatterModifier command, see run_modifier.
+    """
+    fn_data = om.MFnArrayAttrsData()
+    data = fn_data.create()
+    positions = fn_data.vectorArray("position")
+    rotations = fn_data.vectorArray("rotation")
+    scales = fn_data.vectorArray("scale")
+    for i in range(len(transforms)):
+        positions.append(om.MVector(*transforms.translation(i)))
+        rotations.append(om.MVector(*transforms.rotation(i)))
+        scales.append(om.MVector(*transforms.scale(i)))
+    if object_indices is not None:
+        indices = fn_data.doubleArray("objectIndex")
+        for index in object_indices:
+            indices.append(index)
+    sel_list = om.MSelectionList()
+    sel_list.add(instancer + ".inputPoints")
+    modifier = om.MDGModifier()
+    modifier.newPlugValue(sel_list.getPlug(0), data)
+    run_modifier(modifier)
+
+
+def take_modifier():
+    """Return the modifier queued for the scatterModifier command"""
+    return _pending_modifiers.pop()
+
+
+def run_modifier(modifier):
+    """Do an om.MDGModifier as one undoable scatterModifier command"""
+    if not cmds.pluginInfo("scatter_plugin", q=True, loaded=True):
+        cmds.loadPlugin(_PLUGIN_PATH, quiet=True)
+    _pending_modifiers.append(modifier)
+    try:
+        getattr(cmds, scatter_plugin.COMMAND)()
+    finally:
+        del _pending_modifiers[:]
+
+
+def create_instances(source, count, parent):
+    """Return count new instances of source parented under parent
+
+    instance takes many objects at once, so every call instances all the
+    ones made so far and count instances take about log2(count) commands.
+    """
+    instances = []
+    while len(instances) < count:
+        batch = (instances or [source])[:count - len(instances)]
+        instances.extend(cmds.instance(batch))
+    return cmds.parent(instances, parent)
+
+
+def get_transform_matrices(nodes, world=False):
+    """Return the object space matrix of every node as 16 floats, or the
+    world space one with world, read in one pass over the API"""
+    sel_list = om.MSelectionList()
+    for node in nodes:
+        sel_list.add(node)
+    matrices = []
+    for i in range(sel_list.length()):
+        dag_path = sel_list.getDagPath(i)
+        if world:
+            matrices.append(list(dag_path.inclusiveMatrix()))
+        else:
+            matrices.append(list(
+                om.MFnDagNode(dag_path).transformationMatrix()))
+    return matrices
+
+
+def set_transform_matrices(nodes, matrices):
+    """Set the object space matrix of every node in one undoable command
+
+    Each matrix is split into translate, rotate, scale and shear values in
+    the node's rotate order and all of them go into a single modifier.
+    """
+    sel_list = om.MSelectionList()
+    for node in nodes:
+        sel_list.add(node)
+    modifier = om.MDGModifier()
+    for i, matrix in enumerate(matrices):
+        fn_node = om.MFnDependencyNode(sel_list.getDependNode(i))
+        xform = om.MTransformationMatrix(om.MMatrix(list(matrix)))
+        translation = xform.translation(om.MSpace.kTransform)
+        rotation = xform.rotation()
+        rotation.reorderIt(fn_node.findPlug("rotateOrder", False).asInt())
+        values = ([translation.x, translation.y, translation.z] +
+                  [rotation.x, rotation.y, rotation.z] +
+                  list(xform.scale(om.MSpace.kTransform)) +
+                  list(xform.shear(om.MSpace.kTransform)))
+        for name, value in zip(_TRANSFORM_PLUGS, values):
+            modifier.newPlugValueDouble(fn_node.findPlug(name, False), value)
+    run_modifier(modifier)
+
+
+def create_preview_proxy(source, name="scatter_preview_proxy"):
+    """Return a hidden wireframe box the size of source's bounding box"""
+    bbox = cmds.exactWorldBoundingBox(source)
+    pivot = cmds.xform(source, q=True, ws=True, rotatePivot=True)
+    proxy = cmds.polyCube(name=name, width=bbox[3] - bbox[0],
+                          height=bbox[4] - bbox[1],
+                          depth=bbox[5] - bbox[2], constructionHistory=False)[0]
+    cmds.move((bbox[0] + bbox[3]) / 2.0 - pivot[0],
+              (bbox[1] + bbox[4]) / 2.0 - pivot[1],
+              (bbox[2] + bbox[5]) / 2.0 - pivot[2], proxy)
+    cmds.setAttr(proxy + ".overrideEnabled", True)
+    cmds.setAttr(proxy + ".overrideShading", False)
+    cmds.setAttr(proxy + ".visibility", False)
+    return proxy
+
+
+class MayaBackend(scatter_backend.SceneBackend):
+    """Runs the scatter against the open Maya scene
+
+    commands counts every Maya command this module runs, a batch of API
+    edits counting as the one scatterModifier command it goes through.
+    """
+
+    @property
+    def commands(self):
+        return cmds.count
+
+    def selection(self):
+        return cmds.ls(os=True)
+
+    def vertex_selection(self, selection):
+        vertices = cmds.filterExpand(
+            selection, selectionMask=31, expand=False)
+        if vertices is None:
+            vertices = cmds.polyListComponentConversion(selection, tv=True)
+        return get_vertex_selection(vertices or [])
+
+    def mesh_arrays(self, mesh):
+        return get_mesh_arrays(mesh)
+
+    def mesh_triangles(self, mesh):
+        return get_mesh_triangles(mesh)
+
+    def vertex_weights(self, mesh, density_map):
+        return get_vertex_weights(mesh, density_map)
+
+    def bounding_radius(self, node):
+        return get_bounding_radius(node)
+
+    def watch_mesh(self, mesh, callback):
+        return watch_mesh(mesh, callback)
+
+    def unwatch(self, handle):
+        try:
+            om.MMessage.removeCallbacks(handle)
+        except RuntimeError:
+            # Maya already removed them with the deleted node
+            pass
+
+    def is_transform(self, node):
+        return cmds.objectType(node, isType="transform")
+
+    def exists(self, node):
+        return bool(node) and cmds.objExists(node)
+
+    def delete(self, nodes):
+        cmds.delete(nodes)
+
+    def create_group(self, name):
+        return cmds.group(empty=True, name=name)
+
+    def create_instances(self, source, count, parent):
+        return create_instances(source, count, parent)
+
+    def get_transforms(self, nodes, world=False):
+        return get_transform_matrices(nodes, world)
+
+    def set_transforms(self, nodes, matrices):
+        set_transform_matrices(nodes, matrices)
+
+    def create_instancer(self, sources, name):
+        return cmds.instancer(name=name, object=list(sources))
+
+    def set_instancer_points(self, instancer, transforms,
+                             object_indices=None):
+        set_instancer_points(instancer, transforms, object_indices)
+
+    def create_proxy(self, source, name):
+        return create_preview_proxy(source, name)
+
+    def set_display(self, nodes, mode):
+        level = 1 if mode == "bbox" else 0
+        for node in nodes:
+            if cmds.nodeType(node) == "instancer":
+                # 1 is "Bounding Boxes", one box per instance
+                cmds.setAttr(node + ".levelOfDetail", level)
+                continue
+            cmds.setAttr(node + ".overrideEnabled", True)
+            cmds.setAttr(node + ".overrideLevelOfDetail", level)
+
+    def camera_position(self):
+        camera = "persp"
+        panel = cmds.getPanel(withFocus=True)
+        if panel and cmds.getPanel(typeOf=panel) == "modelPanel":
+            camera = cmds.modelPanel(panel, q=True, camera=True)
+        return cmds.xform(camera, q=True, ws=True, translation=True)
+
+    @contextlib.contextmanager
+    def batch(self, name):
+        """Run the block as one undo step with the viewport refresh
+        suspended"""
+        cmds.undoInfo(openChunk=True, chunkName=name)
+        cmds.refresh(suspend=True)
+        try:
+            yield
+        finally:
+            cmds.refresh(suspend=False)
+            cmds.undoInfo(closeChunk=True)
+
+    @contextlib.contextmanager
+    def no_undo(self):
+        """Keep the block out of the undo queue without flushing it"""
+        cmds.undoInfo(stateWithoutFlush=False)
+        try:
+            yield
+        finally:
+            cmds.undoInfo(stateWithoutFlush=True)
+
+    def undo(self):
+        cmds.undo()
+
+    def prepare_workers(self):
+        _set_worker_executable()
+
+    def can_fork(self):
+        # A forked copy of the GUI shares its Qt and Maya threads
+        return bool(cmds.about(batch=True))
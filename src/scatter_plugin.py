@@ -0,0 +1,51 @@
+"""Maya plugin with the command scatter_maya runs its API edits through
+
+Edits made straight through OpenMaya never reach the undo queue. scatter_maya
+builds a whole batch of them in one om.MDGModifier instead and hands it to
+the scatterModifier command, which undo and redo then replay like any other.
+scatter_maya loads this on first use.
+"""
+import sys
+
+import maya.api.OpenMaya as om
+
+COMMAND = "scatterModifier"
+
+
+def maya_useNewAPI():
+    """Tell Maya the plugin uses the Python API 2.0"""
+
+
+class ScatterModifierCommand(om.MPxCommand):
+    """Does, undoes and redoes the modifier scatter_maya queued last"""
+
+    def __init__(self):
+        om.MPxCommand.__init__(self)
+        self.modifier = None
+
+    @staticmethod
+    def creator():
+        return ScatterModifierCommand()
+
+    def doIt(self, args):
+        # Maya loads plugins by path, so reach scatter_maya by module name
+        self.modifier = sys.modules["scatter_maya"].take_modifier()
+        self.modifier.doIt()
+
+    def redoIt(self):
+        self.modifier.doIt()
+
+    def undoIt(self):
+        self.modifier.undoIt()
+
+    def isUndoable(self):
+        return True
+
+
+def initializePlugin(plugin):
+    om.MFnPlugin(plugin).registerCommand(COMMAND,
+                                         ScatterModifierCommand.creator)
+
+
+def uninitializePlugin(plugin):
+    om.MFnPlugin(plugin).deregisterCommand(COMMAND)
@@ -0,0 +1,245 @@
+"""Point cache files of scatter results
+
+A point cache holds what a scatter would instance, one record per point,
+without any scene nodes, so layout and render tools outside Maya can read
+it. PointCacheWriter streams it out a chunk at a time, converting and
+writing CHUNK_SIZE points before moving on to the next ones:
+
+    header        struct HEADER: magic, version, chunk size, chunk count,
+                  point count, table offset
+    chunks        chunk count times:
+      chunk       struct CHUNK: points n in the chunk
+      source ids  n uint32, index into the source table
+      positions   n * 3 float32
+      rotations   n * 4 float32, unit quaternions x, y, z, w
+      scales      n * 3 float32
+      mesh ids    n uint32, index into the destination table
+      point ids   n uint32, destination vertex or surface sample id
+    tables        the source names, then the destination mesh names, each
+                  a uint32 byte size and utf-8 names joined by newlines
+
+Everything is little endian and 4 byte aligned, so PointCache maps the file
+and hands out every column of a chunk as a view without copying it. The
+header is written again once the file is complete, a file cut short has a
+table offset of 0 and is refused. Like scatter_engine this has no Maya
+imports.
+"""
+import array
+import mmap
+import struct
+
+import scatter_cache
+import scatter_engine
+
+MAGIC = b"SCPC"
+POINT_CACHE_VERSION = 1
+HEADER = struct.Struct("<4sHHIIQQ")
+CHUNK = struct.Struct("<I")
+TABLE_SIZE = struct.Struct("<I")
+EXTENSION = ".scpc"
+# Points converted and written at a time
+CHUNK_SIZE = 65536
+# Bytes of one point: source id, 3 + 4 + 3 floats, mesh id and point id
+POINT_SIZE = 13 * 4
+
+
+class PointCacheWriter(object):
+    """Streams scatter points to a point cache file
+
+    Use it as a context manager, or call close, to write the tables and
+    the final header:
+
+        with PointCacheWriter(path, sources) as writer:
+            writer.write(keys, transforms, point_sources)
+    """
+
+    def __init__(self, path, sources, chunk_size=CHUNK_SIZE):
+        self.path = path
+        self.sources = list(sources)
+        self.chunk_size = chunk_size
+        self.meshes = []
+        self.count = 0
+        self.chunks = 0
+        self._meshIndex = {}
+        self._file = open(path, "wb")
+        self._file.write(HEADER.pack(MAGIC, POINT_CACHE_VERSION, 0,
+                                     chunk_size, 0, 0, 0))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            # Leave the header incomplete so the file is never read
+            self._file.close()
+        return False
+
+    def write(self, keys, transforms, point_sources):
+        """Write points, (mesh, id) keys with their TransformBatch and the
+        index into sources of each"""
+        for start in range(0, len(keys), self.chunk_size):
+            self._write_chunk(keys, transforms, point_sources, start,
+                              min(start + self.chunk_size, len(keys)))
+
+    def _mesh_id(self, mesh):
+        if mesh not in self._meshIndex:
+            self._meshIndex[mesh] = len(self.meshes)
+            self.meshes.append(mesh)
+        return self._meshIndex[mesh]
+
+    def _write_chunk(self, keys, transforms, point_sources, start, end):
+        source_ids = array.array("I", point_sources[start:end])
+        positions = array.array("f")
+        rotations = array.array("f")
+        scales = array.array("f")
+        mesh_ids = array.array("I")
+        point_ids = array.array("I")
+        for i in range(start, end):
+            translation, orientation, scale = transforms.decompose(i)
+            positions.extend(translation)
+            rotations.extend(orientation)
+            scales.extend(scale)
+            mesh, point_id = keys[i]
+            mesh_ids.append(self._mesh_id(mesh))
+            point_ids.append(point_id)
+        self._file.write(CHUNK.pack(end - start))
+        for column in (source_ids, positions, rotations, scales, mesh_ids,
+                       point_ids):
+            self._file.write(scatter_cache.to_bytes(column))
+        self.count += end - start
+        self.chunks += 1
+
+    def close(self):
+        if self._file.closed:
+            return
+        table_offset = self._file.tell()
+        for names in (self.sources, self.meshes):
+            table = "\n".join(names).encode("utf-8")
+            self._file.write(TABLE_SIZE.pack(len(table)))
+            self._file.write(table)
+        self._file.seek(0)
+        self._file.write(HEADER.pack(MAGIC, POINT_CACHE_VERSION, 0,
+                                     self.chunk_size, self.chunks,
+                                     self.count, table_offset))
+        self._file.close()
+
+
+def _read_table(data, offset):
+    size, = TABLE_SIZE.unpack_from(data, offset)
+    offset += TABLE_SIZE.size
+    table = data[offset:offset + size].decode("utf-8")
+    return table.split("\n") if table else [], offset + size
+
+
+class PointChunk(object):
+    """The columns of one chunk, as views into the mapped file
+
+    positions and scales hold three floats per point and rotations four,
+    source_ids and mesh_ids index PointCache.sources and
+    PointCache.destinations. On Python 2 the columns are arrays copied out
+    of the map, see scatter_cache.typed_view.
+    """
+
+    def __init__(self, data, offset, count):
+        self.count = count
+        columns = []
+        for typecode, width in (("I", 1), ("f", 3), ("f", 4), ("f", 3),
+                                ("I", 1), ("I", 1)):
+            columns.append(scatter_cache.typed_view(data, offset,
+                                                    count * width, typecode))
+            offset += count * width * 4
+        (self.source_ids, self.positions, self.rotations, self.scales,
+         self.mesh_ids, self.point_ids) = columns
+
+    def __len__(self):
+        return self.count
+
+    def matrices(self):
+        """Return the flat matrices of the chunk's points"""
+        matrices = array.array("d")
+        for i in range(self.count):
+            matrices.extend(scatter_engine.compose_matrix(
+                self.positions[i * 3:i * 3 + 3],
+                scatter_engine.quaternion_to_rows(
+                    self.rotations[i * 4:i * 4 + 4]),
+                self.scales[i * 3:i * 3 + 3]))
+        return matrices
+
+
+class PointCache(object):
+    """A point cache file mapped for reading
+
+    Chunks are only located when the file is opened, their columns are read
+    straight out of the map as they are used.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as cache_file:
+            self._data = mmap.mmap(cache_file.fileno(), 0,
+                                   access=mmap.ACCESS_READ)
+        data = self._data
+        (magic, version, _, self.chunk_size, chunk_count, self.count,
+         table_offset) = HEADER.unpack_from(data, 0)
+        if magic != MAGIC or version != POINT_CACHE_VERSION:
+            raise ValueError("Not a scatter point cache: {0}".format(path))
+        if not table_offset:
+            raise ValueError("Incomplete scatter point cache: {0}".format(
+                path))
+        self._chunks = []
+        offset = HEADER.size
+        for _ in range(chunk_count):
+            count, = CHUNK.unpack_from(data, offset)
+            self._chunks.append((offset + CHUNK.size, count))
+            offset += CHUNK.size + count * POINT_SIZE
+        self.sources, offset = _read_table(data, table_offset)
+        self.destinations, _ = _read_table(data, offset)
+
+    def __len__(self):
+        return self.count
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+        return False
+
+    def chunks(self):
+        """Yield a PointChunk per chunk, in file order"""
+        for offset, count in self._chunks:
+            yield PointChunk(self._data, offset, count)
+
+    def keys(self):
+        """Return the (mesh, id) key of every point"""
+        keys = []
+        for chunk in self.chunks():
+            keys.extend((self.destinations[mesh_id], point_id)
+                        for mesh_id, point_id in zip(chunk.mesh_ids,
+                                                     chunk.point_ids))
+        return keys
+
+    def source_ids(self):
+        source_ids = array.array("l")
+        for chunk in self.chunks():
+            # Python 2 arrays only extend with arrays of the same typecode
+            source_ids.fromlist(chunk.source_ids.tolist())
+        return source_ids
+
+    def transforms(self):
+        """Return a TransformBatch of every point"""
+        transforms = scatter_engine.TransformBatch()
+        for chunk in self.chunks():
+            transforms.matrices.extend(chunk.matrices())
+        return transforms
+
+    def close(self):
+        """Release the map, views handed out stop working"""
+        try:
+            self._data.close()
+        except BufferError:
+            # A chunk is still held, the map goes once that is collected
+            pass
+        self._data = None
@@ -0,0 +1,118 @@
+"""Timings and counters of scatter operations
+
+SceneFile records a ScatterStats per operation (setting the destination,
+computing, previewing or scattering) when its recordStats is on or this
+module's logger is enabled for DEBUG, and logs it there as one JSON line.
+Nothing is timed or wrapped otherwise.
+"""
+import contextlib
+import json
+import logging
+import time
+
+log = logging.getLogger(__name__)
+
+# time.perf_counter is Python 3 only
+timer = getattr(time, "perf_counter", time.time)
+
+
+class _NullPhase(object):
+    """What SceneFile times a phase with when stats are off"""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+NULL_PHASE = _NullPhase()
+
+
+def enabled(record_stats):
+    return record_stats or log.isEnabledFor(logging.DEBUG)
+
+
+class ScatterStats(object):
+    """Wall time per phase and counters of one operation
+
+    Counters include the number of backend calls ("backend_calls" and
+    "calls.<method>") with the seconds spent in each ("seconds.<method>"),
+    the scene commands those ran ("scene_commands"), the instances created
+    and the transforms set.
+    """
+
+    def __init__(self, operation):
+        self.operation = operation
+        self.started = time.time()
+        self.seconds = 0.0
+        self.phases = []
+        self.counters = {}
+        self._start = timer()
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        start = timer()
+        try:
+            yield
+        finally:
+            self.phases.append((name, timer() - start))
+
+    def count(self, name, amount=1):
+        self.counters[name] = self.counters.get(name, 0) + amount
+
+    def finish(self):
+        self.seconds = timer() - self._start
+
+    def as_dict(self):
+        return {
+            "operation": self.operation,
+            "started": self.started,
+            "seconds": round(self.seconds, 6),
+            "phases": [{"name": name, "seconds": round(seconds, 6)}
+                       for name, seconds in self.phases],
+            "counters": dict((name, round(value, 6))
+                             for name, value in self.counters.items()),
+        }
+
+    def to_json(self):
+        return json.dumps(self.as_dict(), sort_keys=True)
+
+
+def export_json(stats, path):
+    """Write a list of ScatterStats to path as a JSON list"""
+    with open(path, "w") as stats_file:
+        json.dump([item.as_dict() for item in stats], stats_file, indent=1,
+                  sort_keys=True)
+
+
+class InstrumentedBackend(object):
+    """Passes every call on to a SceneBackend, counting and timing it"""
+
+    def __init__(self, backend, stats):
+        self.backend = backend
+        self.stats = stats
+
+    def __getattr__(self, name):
+        attr = getattr(self.backend, name)
+        if not callable(attr):
+            return attr
+        stats = self.stats
+
+        def call(*args, **kwargs):
+            start = timer()
+            try:
+                return attr(*args, **kwargs)
+            finally:
+                stats.count("backend_calls")
+                stats.count("calls." + name)
+                stats.count("seconds." + name, timer() - start)
+        return call
+
+    def create_instances(self, source, count, parent):
+        self.stats.count("instances_created", count)
+        return self.__getattr__("create_instances")(source, count, parent)
+
+    def set_transforms(self, nodes, matrices):
+        self.stats.count("transforms_set", len(nodes))
+        return self.__getattr__("set_transforms")(nodes, matrices)
@@ -1,15 +1,17 @@
+import fnmatch
 import logging
-
-import pymel.core as pmc
-from pymel.core.system import Path
+import os
 import re
+
 from PySide2 import QtCore, QtWidgets
-from shiboken2 import wrapInstance
+from shiboken2 import isValid, wrapInstance
 import maya.OpenMayaUI as omui
 import maya.cmds as cmds
 
 log = logging.getLogger(__name__)
 
+_dialog = None
+
 
 def maya_main_window():
     """Return the Maya main window widget"""
@@ -17,6 +19,24 @@ def maya_main_window():
     return wrapInstance(long(main_window), QtWidgets.QWidget)
 
 
+def _pymel():
+    """Import pymel.core on first use, it takes seconds on a cold session"""
+    import pymel.core as pmc
+    return pmc
+
+
+def show():
+    """Show the Smart Save dialog, built once per session and then re-shown
+    as it was left"""
+    global _dialog
+    if _dialog is None or not isValid(_dialog):
+        _dialog = SmartSaveUI()
+    _dialog.show()
+    _dialog.raise_()
+    _dialog.activateWindow()
+    return _dialog
+
+
 class SmartSaveUI(QtWidgets.QDialog):
     """Smart Class UI Class"""
 
@@ -121,8 +141,8 @@ class SmartSaveUI(QtWidgets.QDialog):
         return layout
 
     def _create_folder_ui(self):
-        default_folder = Path(cmds.workspace(rootDirectory=True, query=True))
-        default_folder = default_folder / "scenes"
+        default_folder = os.path.join(
+            cmds.workspace(rootDirectory=True, query=True), "scenes")
         self.folder_le = QtWidgets.QLineEdit(default_folder)
         self.folder_browse_btn = QtWidgets.QPushButton("...")
         layout = QtWidgets.QHBoxLayout()
@@ -134,13 +154,13 @@ class SmartSaveUI(QtWidgets.QDialog):
 class SceneFile(object):
 
     def __init__(self, path=None):
-        self._folder_path = Path(cmds.workspace(
-            query=True, rootDirectory=True)) / "scenes"
+        self._folder_path = os.path.join(cmds.workspace(
+            query=True, rootDirectory=True), "scenes")
         self.descriptor = 'main'
         self.task = 'model'
         self.ver = 1
         self.ext = '.ma'
-        scene = pmc.system.sceneName()
+        scene = cmds.file(query=True, sceneName=True)
         if not path and scene:
             path = scene
         if not path and not scene:
@@ -155,7 +175,7 @@ class SceneFile(object):
     # Note, look into equivalent getter/setter for other languages and how Python property overide contrasts/compares
     @folder_path.setter
     def folder_path(self, val):
-        self._folder_path = Path(val)
+        self._folder_path = os.path.normpath(val)
 
     @property
     def filename(self):
@@ -165,14 +185,12 @@ class SceneFile(object):
 
     @property
     def path(self):
-        return self.folder_path / self.filename
+        return os.path.join(self.folder_path, self.filename)
 
     def _init_from_path(self, path):
-        path = Path(path)
-        self.folder_path = path.parent
-        self.ext = path.ext
-        self.descriptor, self.task, ver = re.findall(
-            '([^_]+)+', path.name.stripext())
+        self.folder_path = os.path.dirname(path)
+        name, self.ext = os.path.splitext(os.path.basename(path))
+        self.descriptor, self.task, ver = re.findall('([^_]+)+', name)
         self.ver = int(ver.split("v")[-1])
 
     def save(self):
@@ -181,12 +199,14 @@ class SceneFile(object):
         Returns:
             Path: The path to the scene file if successful
         """
+        pmc = _pymel()
         try:
             return pmc.system.saveAs(self.path)
         except:
             log.warning(
                 "Missing directory in specified path. Creating directory")
-            self.folder_path.mkdir_p()
+            if not os.path.isdir(self.folder_path):
+                os.makedirs(self.folder_path)
             return pmc.system.saveAs(self.path)
 
     def next_avail_ver(self):
@@ -195,15 +215,17 @@ class SceneFile(object):
         pattern = "{descriptor}_{task}_v*{ext}".format(
             descriptor=self.descriptor, task=self.task, ext=self.ext)
         matching_scenefiles = []
-        for file_ in self.folder_path.files():
-            if file_.name.fnmatch(pattern):
-                matching_scenefiles.append(file_)
+        if os.path.isdir(self.folder_path):
+            for file_ in os.listdir(self.folder_path):
+                if (fnmatch.fnmatch(file_, pattern) and os.path.isfile(
+                        os.path.join(self.folder_path, file_))):
+                    matching_scenefiles.append(file_)
         if not matching_scenefiles:
             return 1
         matching_scenefiles.sort(reverse=True)
         latest_scenefile = matching_scenefiles[0]
         # How do I get auto complete here? Does it not work because latest_scene is dynamic?
-        latest_scenefile = latest_scenefile.name.stripext()
+        latest_scenefile = os.path.splitext(latest_scenefile)[0]
         latest_ver_num = int(latest_scenefile.split("_v")[-1])
         return latest_ver_num + 1
 
@@ -219,6 +241,3 @@ class SceneFile(object):
         self.ver = self.next_avail_ver()
         self.save()
 
-
-# I get Error: WindowsError: file C:\Program Files\Autodesk\Maya2020\Python\lib\site-packages\pymel\util\path.py line 483: 3
-# when in a new scene. Why?
@@ -0,0 +1,50 @@
+import os
+import sys
+
+import pytest
+
+# The tools are plain modules in src, as Maya's script path sees them
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__))), "src"))
+
+import scatter_backend  # noqa: E402
+import scatter_core  # noqa: E402
+
+SIZE = 10
+# seed, percent, align, scale, rotate, offset and relativeOffset
+SETTINGS = (1, 0.5, True, [1, 2] * 3, [0, 360] * 3, [0, 1], False)
+
+
+def grid_mesh():
+    positions, normals, triangles = [], [], []
+    for j in range(SIZE):
+        for i in range(SIZE):
+            positions += [i, 0, j]
+            normals += [0, 1, 0]
+    for j in range(SIZE - 1):
+        for i in range(SIZE - 1):
+            a = j * SIZE + i
+            triangles += [a, a + 1, a + SIZE, a + 1, a + SIZE + 1, a + SIZE]
+    return positions, normals, triangles
+
+
+@pytest.fixture
+def backend():
+    backend = scatter_backend.MemoryBackend()
+    backend.add_mesh("ground", *grid_mesh())
+    backend.add_mesh("rock", [0.5, 0, 0, 0, 0.5, 0, 0, 0, 0.5],
+                     [0, 1, 0] * 3, [0, 1, 2])
+    return backend
+
+
+@pytest.fixture
+def scenefile(backend):
+    scenefile = scatter_core.SceneFile(backend)
+    scenefile.cache = None
+    scenefile.workers = 1
+    backend.select("rock")
+    scenefile.set_scatter_source()
+    backend.select("ground")
+    scenefile.set_scatter_dest()
+    yield scenefile
+    scenefile.close()
@@ -0,0 +1,45 @@
+"""TransformCache files written by store and mapped back by load"""
+import os
+import time
+
+import scatter_cache
+from conftest import SETTINGS
+
+
+def test_store_load_round_trip(scenefile, tmpdir):
+    cache = scatter_cache.TransformCache(str(tmpdir))
+    transforms = scenefile.compute_transforms(*SETTINGS)
+    keys = list(scenefile._transformKeys)
+    normals = [0.0, 1.0, 0.0] * len(keys)
+    cache.store("key", keys, transforms, normals)
+    loaded_keys, loaded, loaded_normals = cache.load("key")
+    assert loaded_keys == keys
+    assert list(loaded.matrices) == list(transforms.matrices)
+    assert list(loaded_normals) == normals
+    assert cache.load("other") is None
+
+
+def test_unreadable_file_is_a_miss(tmpdir):
+    cache = scatter_cache.TransformCache(str(tmpdir))
+    tmpdir.join("key" + scatter_cache.EXTENSION).write_binary(b"SCTR")
+    assert cache.load("key") is None
+
+
+def test_evict_drops_the_least_recently_used(scenefile, tmpdir):
+    transforms = scenefile.compute_transforms(*SETTINGS)
+    keys = list(scenefile._transformKeys)
+    normals = [0.0, 1.0, 0.0] * len(keys)
+    cache = scatter_cache.TransformCache(str(tmpdir))
+    cache.store("old", keys, transforms, normals)
+    cache.store("new", keys, transforms, normals)
+    now = time.time()
+    os.utime(cache._path("old"), (now - 10, now - 10))
+    stale = tmpdir.join("old" + scatter_cache.EXTENSION + ".1" +
+                        scatter_cache.TEMP_EXTENSION)
+    stale.write_binary(b"")
+    stale_time = now - scatter_cache.STALE_TEMP_AGE - 10
+    os.utime(str(stale), (stale_time, stale_time))
+    cache.max_size = os.path.getsize(cache._path("new"))
+    cache.evict()
+    assert sorted(path.basename for path in tmpdir.listdir()) == [
+        "new" + scatter_cache.EXTENSION]
@@ -0,0 +1,156 @@
+"""SceneFile scatters, updates and rollbacks against a MemoryBackend"""
+import pytest
+
+import scatter_cache
+import scatter_core
+from conftest import SETTINGS, SIZE, grid_mesh
+
+
+def _instances(backend):
+    return dict((name, node) for name, node in backend.nodes.items()
+                if node["type"] == "instance")
+
+
+def _snapshot(backend):
+    return dict((name, dict(node)) for name, node in backend.nodes.items())
+
+
+def test_scatter_places_an_instance_per_point(backend, scenefile):
+    group = scenefile.scatter(*SETTINGS, mode="instances")
+    instances = _instances(backend)
+    assert len(instances) == SIZE * SIZE // 2
+    assert all(node["parent"] == group for node in instances.values())
+    transforms = scenefile.compute_transforms(*SETTINGS)
+    for i, key in enumerate(scenefile._transformKeys):
+        node = scenefile.scatterMap[key][0]
+        assert instances[node]["matrix"] == list(transforms.matrix(i))
+
+
+def test_update_keeps_the_nodes_of_kept_points(backend, scenefile):
+    group = scenefile.scatter(*SETTINGS, mode="instances")
+    before = dict(scenefile.scatterMap)
+    settings = (2,) + SETTINGS[1:]
+    assert scenefile.scatter(*settings, mode="instances",
+                             update=True) == group
+    assert len(_instances(backend)) == len(scenefile.scatterMap)
+    kept = [key for key in before if key in scenefile.scatterMap]
+    assert kept
+    assert all(scenefile.scatterMap[key] == before[key] for key in kept)
+
+
+def test_update_with_fewer_points_deletes_the_surplus(backend, scenefile):
+    scenefile.scatter(*SETTINGS, mode="instances")
+    settings = SETTINGS[:1] + (0.2,) + SETTINGS[2:]
+    scenefile.scatter(*settings, mode="instances", update=True)
+    assert len(_instances(backend)) == SIZE * SIZE // 5
+
+
+def test_rollback_restores_the_previous_scatter(backend, scenefile):
+    scenefile.scatter(*SETTINGS, mode="instances")
+    nodes = _snapshot(backend)
+    scatter_map = dict(scenefile.scatterMap)
+    settings = (2, 0.8) + SETTINGS[2:]
+    scenefile.scatter(*settings, mode="instances", update=True)
+    assert _snapshot(backend) != nodes
+    scenefile.rollback_scatter()
+    assert _snapshot(backend) == nodes
+    assert scenefile.scatterMap == scatter_map
+
+
+def test_rollback_of_the_first_scatter_clears_it(backend, scenefile):
+    nodes = _snapshot(backend)
+    scenefile.scatter(*SETTINGS, mode="instancer")
+    assert "scatter_instancer" in backend.nodes
+    scenefile.rollback_scatter()
+    assert _snapshot(backend) == nodes
+    assert scenefile.scatterNode is None
+
+
+def test_only_the_last_batch_is_undone(backend):
+    with backend.batch("first"):
+        backend.create_group("first_grp")
+    with backend.batch("second"):
+        backend.create_group("second_grp")
+    backend.undo()
+    backend.undo()
+    assert "first_grp" in backend.nodes
+    assert "second_grp" not in backend.nodes
+
+
+def test_unknown_density_map_is_refused(backend, scenefile):
+    backend.add_density_map("ground", "paint", [1.0] * (SIZE * SIZE))
+    assert scenefile.set_density_map("paint") == "paint"
+    with pytest.raises(ValueError):
+        scenefile.set_density_map("missing")
+    assert scenefile.densityMap is None
+
+
+def test_update_on_another_destination_keeps_the_previous(backend,
+                                                          scenefile):
+    backend.add_mesh("wall", *grid_mesh())
+    first = scenefile.scatter(*SETTINGS, mode="instances")
+    first_nodes = set(node for node, _ in scenefile.scatterMap.values())
+    backend.select("wall")
+    scenefile.set_scatter_dest()
+    second = scenefile.scatter(*SETTINGS, mode="instances", update=True)
+    assert second != first
+    assert first_nodes <= set(_instances(backend))
+    assert len(_instances(backend)) == 2 * len(first_nodes)
+
+
+def test_rotate_aligns_after_a_disk_cache_hit(backend, tmpdir):
+    positions, normals, triangles = grid_mesh()
+    # Stand the grid up as a wall facing +X
+    wall = [value for i in range(0, len(positions), 3)
+            for value in (0, positions[i + 2], positions[i])]
+    backend.add_mesh("wall", wall, [1, 0, 0] * (SIZE * SIZE), triangles)
+    settings = SETTINGS[:3] + ([1, 1] * 3, [0, 0] * 3) + SETTINGS[5:]
+    cache = scatter_cache.TransformCache(str(tmpdir))
+    aligned = None
+    for _ in range(2):
+        # The second session reads the transforms back from the disk cache
+        scenefile = scatter_core.SceneFile(backend)
+        scenefile.cache = cache
+        scenefile.workers = 1
+        scenefile.recordStats = True
+        backend.select("rock")
+        scenefile.set_scatter_source()
+        backend.select("wall")
+        scenefile.set_scatter_dest()
+        group = scenefile.scatter(*settings, mode="instancer")
+        if aligned is None:
+            aligned = list(backend.nodes[group]["points"].matrices)
+    assert scenefile.stats[-1].counters["cache_hits"] == 1
+    backend.select(group)
+    assert scenefile.rerandomize(1, rotate=[0, 0] * 3, align=True)
+    assert list(backend.nodes[group]["points"].matrices) == aligned
+
+
+def test_preview_only_reads_the_disk_cache(scenefile, tmpdir):
+    scenefile.cache = scatter_cache.TransformCache(str(tmpdir))
+    scenefile.preview(*SETTINGS)
+    assert not tmpdir.listdir()
+    scenefile.scatter(*SETTINGS, mode="instances")
+    assert len(tmpdir.listdir()) == 1
+
+
+@pytest.mark.parametrize("distribution", ["vertices", "area", "poisson"])
+def test_parallel_scatter_matches_serial(backend, monkeypatch, distribution):
+    monkeypatch.setattr(scatter_core, "PARALLEL_THRESHOLD", 0)
+    backend.add_mesh("wall", *grid_mesh())
+    results = []
+    for workers in (1, 2):
+        scenefile = scatter_core.SceneFile(backend)
+        scenefile.cache = None
+        scenefile.workers = workers
+        scenefile.distribution = distribution
+        scenefile.avoidOverlap = True
+        backend.select("rock")
+        scenefile.set_scatter_source()
+        backend.select("ground", "wall")
+        scenefile.set_scatter_dest()
+        transforms = scenefile.compute_transforms(*SETTINGS)
+        assert (scenefile._pool is not None) == (workers > 1)
+        results.append((scenefile._transformKeys, list(transforms.matrices)))
+        scenefile.close()
+    assert results[0][0] and results[0] == results[1]
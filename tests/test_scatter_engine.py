@@ -0,0 +1,78 @@
+"""Rotation math, seeded sampling and overlap rejection of scatter_engine"""
+import collections
+
+import scatter_engine
+
+
+def _close(a, b, tolerance=1e-9):
+    return all(abs(x - y) <= tolerance for x, y in zip(a, b))
+
+
+def _rows_close(a, b):
+    return all(_close(row_a, row_b) for row_a, row_b in zip(a, b))
+
+
+ANGLES = [(0, 0, 0), (30, 45, 60), (-120, 10, 170), (90, 20, -35),
+          (15, -80, 200)]
+
+
+def test_euler_round_trip():
+    for angles in ANGLES:
+        rows = scatter_engine.euler_to_rows(*angles)
+        euler = scatter_engine.rows_to_euler(rows)
+        assert _rows_close(scatter_engine.euler_to_rows(*euler), rows)
+
+
+def test_quaternion_round_trip():
+    for angles in ANGLES:
+        rows = scatter_engine.euler_to_rows(*angles)
+        quaternion = scatter_engine.rows_to_quaternion(rows)
+        assert abs(sum(value * value for value in quaternion) - 1.0) < 1e-9
+        assert _rows_close(scatter_engine.quaternion_to_rows(quaternion),
+                           rows)
+
+
+def test_batch_decomposes_what_compose_matrix_built():
+    rows = scatter_engine.euler_to_rows(30, 45, 60)
+    batch = scatter_engine.TransformBatch(
+        scatter_engine.compose_matrix((1, 2, 3), rows, (2, 3, 4)))
+    translation, quaternion, scale = batch.decompose(0)
+    assert translation == [1, 2, 3]
+    assert _close(scale, (2, 3, 4))
+    assert _rows_close(scatter_engine.quaternion_to_rows(quaternion), rows)
+    assert _close(batch.rotation(0), (30, 45, 60))
+
+
+def test_sample_indices_are_distinct_and_keep_their_prefix():
+    picks = scatter_engine.sample_indices(1000, 400, 7)
+    assert len(set(picks)) == 400
+    assert all(0 <= index < 1000 for index in picks)
+    for k in (1, 50, 399):
+        assert scatter_engine.sample_indices(1000, k, 7) == picks[:k]
+    assert scatter_engine.sample_indices(1000, 400, 8) != picks
+    assert sorted(scatter_engine.sample_indices(10, 20, 7)) == list(range(10))
+
+
+def test_alias_table_draws_in_proportion_to_the_weights():
+    weights = [1.0, 0.0, 3.0, 6.0]
+    table = scatter_engine.AliasTable(weights)
+    rng = scatter_engine.CounterRandom(3)
+    draws = 20000
+    counts = collections.Counter(table.draw(rng) for _ in range(draws))
+    assert counts[1] == 0
+    for i, weight in enumerate(weights):
+        assert abs(counts[i] / float(draws) - weight / 10.0) < 0.02
+
+
+def test_reject_overlaps_keeps_the_earlier_of_close_points():
+    rows = scatter_engine.euler_to_rows(0, 0, 0)
+    matrices = []
+    for position, scale in [((0, 0, 0), 1), ((0.5, 0, 0), 1),
+                            ((3, 0, 0), 1), ((5, 0, 0), 3)]:
+        matrices += scatter_engine.compose_matrix(position, rows,
+                                                  (scale,) * 3)
+    batch = scatter_engine.TransformBatch(matrices)
+    assert scatter_engine.reject_overlaps(batch, 0.0) == [0, 1, 2, 3]
+    # The last sphere is scaled up to radius 3 and reaches the third
+    assert scatter_engine.reject_overlaps(batch, 1.0) == [0, 2]
+    assert scatter_engine.reject_overlaps(batch, 0.2) == [0, 1, 2, 3]
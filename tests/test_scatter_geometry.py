@@ -0,0 +1,45 @@
+"""GeometryCache invalidation and its memory budget"""
+import scatter_geometry
+from conftest import grid_mesh
+
+
+def _geometry(backend, mesh):
+    positions, normals = backend.mesh_arrays(mesh)
+    return scatter_geometry.MeshGeometry(positions, normals,
+                                         backend.mesh_triangles(mesh))
+
+
+def test_changed_mesh_is_dropped_and_unwatched(backend):
+    cache = scatter_geometry.GeometryCache(backend)
+    geometry = cache.put("ground", _geometry(backend, "ground"))
+    assert cache.get("ground") is geometry
+    assert cache.size == geometry.nbytes
+    backend.add_mesh("ground", *grid_mesh())
+    assert "ground" not in cache
+    assert cache.size == 0
+    assert cache.get("ground") is None
+    assert not backend._watchers["ground"]
+
+
+def test_derived_values_count_against_the_budget(backend):
+    cache = scatter_geometry.GeometryCache(backend)
+    geometry = cache.put("ground", _geometry(backend, "ground"))
+    size = cache.size
+    areas = [1.0] * 100
+    assert cache.add_derived("ground", "areas", areas) is areas
+    assert geometry.derived["areas"] is areas
+    assert cache.size == size + scatter_geometry.size_of(areas)
+    cache.add_derived("ground", "areas", [])
+    assert cache.size == size + scatter_geometry.size_of([])
+
+
+def test_least_recently_used_goes_over_budget(backend):
+    backend.add_mesh("wall", *grid_mesh())
+    ground = _geometry(backend, "ground")
+    cache = scatter_geometry.GeometryCache(backend, max_size=ground.nbytes)
+    cache.put("ground", ground)
+    cache.put("rock", _geometry(backend, "rock"))
+    assert "ground" not in cache
+    cache.put("wall", _geometry(backend, "wall"))
+    assert "rock" not in cache and "wall" in cache
+    assert not backend._watchers["ground"]
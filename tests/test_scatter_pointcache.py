@@ -0,0 +1,55 @@
+"""Point cache files written by export_points and read by import_points"""
+import os
+
+import pytest
+
+import scatter_pointcache
+from conftest import SETTINGS
+
+
+def _close(a, b, tolerance=1e-4):
+    return all(abs(x - y) <= tolerance for x, y in zip(a, b))
+
+
+def test_export_import_round_trip(backend, scenefile, tmpdir):
+    path = str(tmpdir.join("points" + scatter_pointcache.EXTENSION))
+    count = scenefile.export_points(path, *SETTINGS)
+    keys = list(scenefile._transformKeys)
+    transforms = scenefile.compute_transforms(*SETTINGS)
+    sources = list(scenefile.assign_sources(SETTINGS[0]))
+    instancer = scenefile.import_points(path)
+    node = backend.nodes[instancer]
+    assert count == len(keys) == len(node["points"])
+    assert node["sources"] == ["rock"]
+    assert list(node["object_indices"]) == sources
+    assert scenefile.scatterPoints[0] == keys
+    for i in range(count):
+        # Positions, rotations and scales are stored as float32
+        assert _close(node["points"].matrix(i), transforms.matrix(i))
+
+
+def test_small_chunks_read_back_in_order(tmpdir, scenefile):
+    path = str(tmpdir.join("chunks" + scatter_pointcache.EXTENSION))
+    transforms = scenefile.compute_transforms(*SETTINGS)
+    keys = scenefile._transformKeys
+    with scatter_pointcache.PointCacheWriter(path, ["rock"],
+                                             chunk_size=7) as writer:
+        writer.write(keys, transforms, [0] * len(keys))
+    with scatter_pointcache.PointCache(path) as point_cache:
+        assert len(point_cache) == len(keys)
+        assert len(list(point_cache.chunks())) == -(-len(keys) // 7)
+        assert point_cache.keys() == keys
+        assert list(point_cache.source_ids()) == [0] * len(keys)
+
+
+def test_incomplete_file_is_refused(tmpdir, scenefile):
+    path = str(tmpdir.join("cut" + scatter_pointcache.EXTENSION))
+    transforms = scenefile.compute_transforms(*SETTINGS)
+    with pytest.raises(RuntimeError):
+        with scatter_pointcache.PointCacheWriter(path, ["rock"]) as writer:
+            writer.write(scenefile._transformKeys, transforms,
+                         [0] * len(transforms))
+            raise RuntimeError("interrupted")
+    assert os.path.exists(path)
+    with pytest.raises(ValueError):
+        scatter_pointcache.PointCache(path)